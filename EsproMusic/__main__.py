@@ -1,29 +1,47 @@
 import asyncio
 import importlib
+import time
 
 from pyrogram import idle
 from pytgcalls.exceptions import NoActiveGroupCall
 
 import config
-from EsproMusic import LOGGER, app, userbot
-from EsproMusic.core.call import Ritik
+from EsproMusic import LOGGER, YouTube, app, userbot
+from EsproMusic.core.call import Ritik, first_audio_stats
 from EsproMusic.misc import sudo
 from EsproMusic.plugins import ALL_MODULES
-from EsproMusic.utils.database import get_banned_users, get_gbanned
+from EsproMusic.utils.database import (
+    ensure_indexes,
+    flush_served,
+    get_banned_users,
+    get_gbanned,
+    load_flags,
+    migrate_chat_settings,
+    refresh_flags,
+)
+from EsproMusic.utils.metrics import log_metrics, report
+from EsproMusic.utils.process import process_stats
+from EsproMusic.utils.stream.actor import mailbox_stats
 from config import BANNED_USERS
 
 
 async def init():
-    if (
-        not config.STRING1
-        and not config.STRING2
-        and not config.STRING3
-        and not config.STRING4
-        and not config.STRING5
-    ):
+    if not config.STRING_SESSIONS:
         LOGGER(__name__).error("Assistant client variables not defined, exiting...")
         exit()
+    timings = []
+    mark = time.monotonic()
+
+    def phase(name):
+        nonlocal mark
+        now = time.monotonic()
+        timings.append((name, now - mark))
+        mark = now
+
     await sudo()
+    await migrate_chat_settings()
+    await ensure_indexes()
+    await load_flags()
     try:
         users = await get_gbanned()
         for user_id in users:
@@ -33,12 +51,17 @@ async def init():
             BANNED_USERS.add(user_id)
     except:
         pass
+    phase("database")
     await app.start()
+    phase("bot")
     for all_module in ALL_MODULES:
         importlib.import_module("EsproMusic.plugins" + all_module)
     LOGGER("EsproMusic.plugins").info("Successfully Imported Modules...")
+    phase("plugins")
     await userbot.start()
+    phase("assistants")
     await Ritik.start()
+    phase("pytgcalls")
     try:
         await Ritik.stream_call("https://te.legra.ph/file/29f784eb49d230ab62e9e.mp4")
     except NoActiveGroupCall:
@@ -48,11 +71,32 @@ async def init():
         exit()
     except:
         pass
+    phase("test call")
     await Ritik.decorators()
+    asyncio.create_task(Ritik.supervise())
+    asyncio.create_task(Ritik.govern())
+    asyncio.create_task(refresh_flags())
+    report("http", YouTube.pool_stats)
+    report("metadata", YouTube.meta_stats)
+    report("downloads", YouTube.download_stats)
+    report("first audio", first_audio_stats)
+    report("processes", process_stats)
+    report("mailboxes", mailbox_stats)
+    asyncio.create_task(log_metrics())
+    phase("handlers")
+    LOGGER("EsproMusic").info(
+        "Startup took %.1fs: %s"
+        % (
+            sum(took for _, took in timings),
+            ", ".join(f"{name} {took:.1f}s" for name, took in timings),
+        )
+    )
     LOGGER("EsproMusic").info("EsproMusicBot Started Successfully \n\n Yaha App ko nahi aana hai aapni girlfriend ko bhej sakte hai @Esprosupport ")
     await idle()
+    await flush_served()
     await app.stop()
     await userbot.stop()
+    await YouTube.close()
     LOGGER("EsproMusic").info("Stopping Espro Music Bot...")
 
 
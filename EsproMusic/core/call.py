@@ -1,48 +1,159 @@
 import asyncio
 import os
+import time
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Union
+from typing import Optional, Union
 
 from pyrogram import Client
+from pyrogram.errors import UserAlreadyParticipant, UserNotParticipant
+from pyrogram.raw.functions import Ping
 from pyrogram.types import InlineKeyboardMarkup
 from pytgcalls import PyTgCalls, StreamType
 from pytgcalls.exceptions import (
     AlreadyJoinedError,
     NoActiveGroupCall,
+    NotInGroupCallError,
     TelegramServerError,
 )
 from pytgcalls.types import Update
 from pytgcalls.types.input_stream import AudioPiped, AudioVideoPiped
-from pytgcalls.types.input_stream.quality import HighQualityAudio, MediumQualityVideo
 from pytgcalls.types.stream import StreamAudioEnded
 
 import config
-from EsproMusic import LOGGER, YouTube, app
+from EsproMusic import LOGGER, YouTube, app, userbot
+from EsproMusic.core.userbot import assistant_latency, assistants
 from EsproMusic.misc import db
+from EsproMusic.platforms.Youtube import PROGRESSIVE_STALL_TIMEOUT
 from EsproMusic.utils.database import (
+    active,
     add_active_chat,
     add_active_video_chat,
+    assistantdict,
+    get_assistant_loads,
     get_lang,
     get_loop,
+    get_quality,
     group_assistant,
     is_autoend,
+    least_loaded_assistant,
     Music_on,
     remove_active_chat,
     remove_active_video_chat,
+    set_assistant_new,
     set_loop,
 )
 from EsproMusic.utils.exceptions import AssistantErr
-from EsproMusic.utils.formatters import check_duration, seconds_to_min, speed_converter
+from EsproMusic.utils.formatters import seconds_to_min, time_to_seconds
 from EsproMusic.utils.inline.play import stream_markup
+from EsproMusic.utils.mediacache import playback_cache
+from EsproMusic.utils.process import run_ffmpeg
+from EsproMusic.utils.stream.actor import run_in_chat
 from EsproMusic.utils.stream.autoclear import auto_clean
+from EsproMusic.utils.stream.normalize import PCM_INPUT, normalized
+from EsproMusic.utils.stream.prefetch import resolve_queue_head, schedule_prefetch
+from EsproMusic.utils.stream.quality import effective_profile, govern, stream_parameters
 from EsproMusic.utils.thumbnails import gen_thumb
 from strings import get_string
 
 autoend = {}
 counter = {}
+# Assistant supervision
+SUPERVISOR_INTERVAL = 30
+PING_TIMEOUT = 10
+MAX_FAILURES = 3  # consecutive failed checks before an assistant's calls are moved
+EVENT_WINDOW = 120
+EVENT_BURST = 5  # kicks/failed joins/failed stream changes within EVENT_WINDOW that count as a failure
+REBALANCE_MARGIN = 3
+health = {}
+rebalancing = set()
+started = set()
+# chat_id -> number of the assistant in its voice chat, None when known to be in none.
+# Chats missing here are unknown and get a sweep over every assistant.
+in_call = {}
+# chat_id -> task posting the current track's now-playing message
+announcing = {}
+
+# Seconds from a play command to audio starting in the call, most recent last
+first_audio = deque(maxlen=200)
+
+
+def first_audio_stats() -> dict:
+    samples = sorted(first_audio)
+    if not samples:
+        return {"samples": 0}
+    return {
+        "samples": len(samples),
+        "median": round(samples[len(samples) // 2], 2),
+        "p90": round(samples[min(len(samples) - 1, int(len(samples) * 0.9))], 2),
+    }
+
+
+def _setpts(speed) -> float:
+    return round(1 / float(speed), 2)
+
+
+def _tempo_parameters(speed, video: bool, position: int) -> str:
+    """
+    ffmpeg parameters playing a source file from `position` seconds at `speed`.
+    The seek stays an input option; "-atmid" puts the audio filter after the input.
+    Video is retimed on the input side with -itsscale, because PyTgCalls adds its
+    own "-vf scale=..." after ours and ffmpeg keeps only the last video filter.
+    """
+    parameters = f"-ss {seconds_to_min(position)}"
+    if video:
+        parameters += f" -itsscale:v {1 / float(speed):.6f}"
+    return f"{parameters} -atmid -filter:a atempo={speed}"
+
+
+def _live_tempo(entry: dict) -> bool:
+    """True when the entry's speed is applied live rather than by a transcoded copy."""
+    return str(entry.get("speed") or "1.0") != "1.0" and not entry.get("speed_path")
+
+
+def _position_parameters(entry: dict, position: int) -> str:
+    """ffmpeg parameters resuming `entry` at `position` seconds of its current timeline."""
+    if _live_tempo(entry):
+        speed = entry["speed"]
+        return _tempo_parameters(
+            speed, str(entry["streamtype"]) == "video", int(position * float(speed))
+        )
+    return f"-ss {seconds_to_min(position)} -to {entry['dur']}"
+
+
+def _piped(path, video: bool, parameters: str = "", chat_id: int = None):
+    audio_parameters, video_parameters = stream_parameters(chat_id)
+    if video:
+        return AudioVideoPiped(
+            path,
+            audio_parameters=audio_parameters,
+            video_parameters=video_parameters,
+            additional_ffmpeg_parameters=parameters,
+        )
+    pcm = normalized(path)
+    if pcm:
+        # Input options go first, so seeks and tempo filters still apply
+        path, parameters = pcm, f"{PCM_INPUT} {parameters}".strip()
+    else:
+        expected = YouTube.growing_duration(path)
+        if expected is not None:
+            # Keep reading as the download appends instead of ending at the current
+            # EOF, but stop at the known length rather than waiting out the timeout
+            follow = f"-follow 1 -rw_timeout {PROGRESSIVE_STALL_TIMEOUT * 1000000}"
+            if expected and "-to " not in parameters:
+                follow += f" -to {expected}"
+            parameters = f"{follow} {parameters}".strip()
+    return AudioPiped(
+        path,
+        audio_parameters=audio_parameters,
+        additional_ffmpeg_parameters=parameters,
+    )
 
 
 async def _clear_(chat_id):
+    task = announcing.pop(chat_id, None)
+    if task:
+        task.cancel()
     db[chat_id] = []
     await remove_active_video_chat(chat_id)
     await remove_active_chat(chat_id)
@@ -50,56 +161,35 @@ async def _clear_(chat_id):
 
 class Call(PyTgCalls):
     def __init__(self):
-        self.userbot1 = Client(
-            name="EsproAss1",
-            api_id=config.API_ID,
-            api_hash=config.API_HASH,
-            session_string=str(config.STRING1),
-        )
-        self.one = PyTgCalls(
-            self.userbot1,
-            cache_duration=100,
-        )
-        self.userbot2 = Client(
-            name="EsproAss2",
-            api_id=config.API_ID,
-            api_hash=config.API_HASH,
-            session_string=str(config.STRING2),
-        )
-        self.two = PyTgCalls(
-            self.userbot2,
-            cache_duration=100,
-        )
-        self.userbot3 = Client(
-            name="EsproAss3",
-            api_id=config.API_ID,
-            api_hash=config.API_HASH,
-            session_string=str(config.STRING3),
-        )
-        self.three = PyTgCalls(
-            self.userbot3,
-            cache_duration=100,
-        )
-        self.userbot4 = Client(
-            name="EsproAss4",
-            api_id=config.API_ID,
-            api_hash=config.API_HASH,
-            session_string=str(config.STRING4),
-        )
-        self.four = PyTgCalls(
-            self.userbot4,
-            cache_duration=100,
-        )
-        self.userbot5 = Client(
-            name="EsproAss5",
-            api_id=config.API_ID,
-            api_hash=config.API_HASH,
-            session_string=str(config.STRING5),
-        )
-        self.five = PyTgCalls(
-            self.userbot5,
-            cache_duration=100,
-        )
+        self.userbots = {}
+        self.calls = {}
+        for number, session in config.STRING_SESSIONS.items():
+            self.userbots[number] = Client(
+                name=f"EsproAss{number}",
+                api_id=config.API_ID,
+                api_hash=config.API_HASH,
+                session_string=str(session),
+            )
+            self.calls[number] = PyTgCalls(
+                self.userbots[number],
+                cache_duration=100,
+            )
+
+    def _joined(self, client, chat_id: int):
+        in_call[chat_id] = self._number_of(client)
+
+    async def _leave(self, client, chat_id: int):
+        number = self._number_of(client)
+        try:
+            await client.leave_group_call(chat_id)
+        except NotInGroupCallError:
+            pass
+        except Exception:
+            if in_call.get(chat_id) == number:
+                in_call.pop(chat_id, None)
+            raise
+        if in_call.get(chat_id) == number:
+            in_call[chat_id] = None
 
     async def pause_stream(self, chat_id: int):
         assistant = await group_assistant(self, chat_id)
@@ -113,105 +203,101 @@ class Call(PyTgCalls):
         assistant = await group_assistant(self, chat_id)
         try:
             await _clear_(chat_id)
-            await assistant.leave_group_call(chat_id)
+            await self._leave(assistant, chat_id)
         except:
             pass
 
     async def stop_stream_force(self, chat_id: int):
-        try:
-            if config.STRING1:
-                await self.one.leave_group_call(chat_id)
-        except:
-            pass
-        try:
-            if config.STRING2:
-                await self.two.leave_group_call(chat_id)
-        except:
-            pass
-        try:
-            if config.STRING3:
-                await self.three.leave_group_call(chat_id)
-        except:
-            pass
-        try:
-            if config.STRING4:
-                await self.four.leave_group_call(chat_id)
-        except:
-            pass
-        try:
-            if config.STRING5:
-                await self.five.leave_group_call(chat_id)
-        except:
-            pass
+        if chat_id in in_call:
+            number = in_call[chat_id]
+            if number is None:
+                left = True
+            else:
+                try:
+                    await self._leave(self.calls[number], chat_id)
+                    left = True
+                except:
+                    left = False
+        else:
+            left = False
+        if not left:
+            # Registry does not know this chat: try every assistant
+            for call in self.calls.values():
+                try:
+                    await call.leave_group_call(chat_id)
+                except:
+                    pass
+            in_call[chat_id] = None
         try:
             await _clear_(chat_id)
         except:
             pass
 
+    async def _transcode_speed(self, file_path, speed, video: bool) -> str:
+        key = (os.path.abspath(file_path), speed)
+        out = playback_cache.get(key)
+        if out:
+            return out
+        ext = os.path.splitext(file_path)[1].lstrip(".") or "mp4"
+        # ffmpeg picks the container from the extension, so no ".part" suffix
+        temp = playback_cache.temp_path(key, ext, suffix="")
+        filters = f"-filter:a atempo={speed}"
+        if video:
+            filters = f"-filter:v setpts={_setpts(speed)}*PTS {filters}"
+        code = await run_ffmpeg(f"ffmpeg -y -i {file_path} {filters} {temp}")
+        if code != 0 or not os.path.isfile(temp):
+            playback_cache.discard(temp)
+            raise AssistantErr(f"Speed transcode of {file_path} failed")
+        return playback_cache.commit(key, temp, ext)
+
     async def speedup_stream(self, chat_id: int, file_path, speed, playing):
         assistant = await group_assistant(self, chat_id)
-        if str(speed) != str("1.0"):
-            base = os.path.basename(file_path)
-            chatdir = os.path.join(os.getcwd(), "playback", str(speed))
-            if not os.path.isdir(chatdir):
-                os.makedirs(chatdir)
-            out = os.path.join(chatdir, base)
-            if not os.path.isfile(out):
-                if str(speed) == str("0.5"):
-                    vs = 2.0
-                if str(speed) == str("0.75"):
-                    vs = 1.35
-                if str(speed) == str("1.5"):
-                    vs = 0.68
-                if str(speed) == str("2.0"):
-                    vs = 0.5
-                proc = await asyncio.create_subprocess_shell(
-                    cmd=(
-                        "ffmpeg "
-                        "-i "
-                        f"{file_path} "
-                        "-filter:v "
-                        f"setpts={vs}*PTS "
-                        "-filter:a "
-                        f"atempo={speed} "
-                        f"{out}"
-                    ),
-                    stdin=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                )
-                await proc.communicate()
-            else:
-                pass
-        else:
-            out = file_path
-        dur = await asyncio.get_event_loop().run_in_executor(None, check_duration, out)
-        dur = int(dur)
-        played, con_seconds = speed_converter(playing[0]["played"], speed)
+        entry = playing[0]
+        video = entry["streamtype"] == "video"
+        length = int(entry.get("old_second") or entry["seconds"])
+        # Position in the source file, whatever speed is playing right now
+        position = int(entry["played"] * float(entry.get("speed") or 1.0))
+        played = int(position / float(speed))
+        dur = int(length / float(speed))
         duration = seconds_to_min(dur)
-        stream = (
-            AudioVideoPiped(
-                out,
-                audio_parameters=HighQualityAudio(),
-                video_parameters=MediumQualityVideo(),
-                additional_ffmpeg_parameters=f"-ss {played} -to {duration}",
-            )
-            if playing[0]["streamtype"] == "video"
-            else AudioPiped(
-                out,
-                audio_parameters=HighQualityAudio(),
-                additional_ffmpeg_parameters=f"-ss {played} -to {duration}",
+        out = None
+        if str(speed) == str("1.0"):
+            stream = _piped(
+                file_path, video, f"-ss {seconds_to_min(position)}", chat_id
             )
-        )
-        if str(db[chat_id][0]["file"]) == str(file_path):
-            await assistant.change_stream(chat_id, stream)
         else:
+            # Apply the tempo inside the call's own ffmpeg, starting where we are
+            stream = _piped(
+                file_path, video, _tempo_parameters(speed, video, position), chat_id
+            )
+        if str(db[chat_id][0]["file"]) != str(file_path):
             raise AssistantErr("Umm")
+        try:
+            await assistant.change_stream(chat_id, stream)
+        except Exception as e:
+            if str(speed) == str("1.0"):
+                raise
+            LOGGER(__name__).warning(
+                f"Live speed change in {chat_id} failed, transcoding instead: {e}"
+            )
+            out = await self._transcode_speed(file_path, speed, video)
+            if str(db[chat_id][0]["file"]) != str(file_path):
+                raise AssistantErr("Umm")
+            await assistant.change_stream(
+                chat_id,
+                _piped(
+                    out,
+                    video,
+                    f"-ss {seconds_to_min(played)} -to {duration}",
+                    chat_id,
+                ),
+            )
         if str(db[chat_id][0]["file"]) == str(file_path):
             exis = (playing[0]).get("old_dur")
             if not exis:
                 db[chat_id][0]["old_dur"] = db[chat_id][0]["dur"]
                 db[chat_id][0]["old_second"] = db[chat_id][0]["seconds"]
-            db[chat_id][0]["played"] = con_seconds
+            db[chat_id][0]["played"] = played
             db[chat_id][0]["dur"] = duration
             db[chat_id][0]["seconds"] = dur
             db[chat_id][0]["speed_path"] = out
@@ -227,7 +313,7 @@ class Call(PyTgCalls):
         await remove_active_video_chat(chat_id)
         await remove_active_chat(chat_id)
         try:
-            await assistant.leave_group_call(chat_id)
+            await self._leave(assistant, chat_id)
         except:
             pass
 
@@ -239,14 +325,7 @@ class Call(PyTgCalls):
         image: Union[bool, str] = None,
     ):
         assistant = await group_assistant(self, chat_id)
-        if video:
-            stream = AudioVideoPiped(
-                link,
-                audio_parameters=HighQualityAudio(),
-                video_parameters=MediumQualityVideo(),
-            )
-        else:
-            stream = AudioPiped(link, audio_parameters=HighQualityAudio())
+        stream = _piped(link, bool(video), chat_id=chat_id)
         await assistant.change_stream(
             chat_id,
             stream,
@@ -254,20 +333,12 @@ class Call(PyTgCalls):
 
     async def seek_stream(self, chat_id, file_path, to_seek, duration, mode):
         assistant = await group_assistant(self, chat_id)
-        stream = (
-            AudioVideoPiped(
-                file_path,
-                audio_parameters=HighQualityAudio(),
-                video_parameters=MediumQualityVideo(),
-                additional_ffmpeg_parameters=f"-ss {to_seek} -to {duration}",
-            )
-            if mode == "video"
-            else AudioPiped(
-                file_path,
-                audio_parameters=HighQualityAudio(),
-                additional_ffmpeg_parameters=f"-ss {to_seek} -to {duration}",
-            )
-        )
+        playing = db.get(chat_id)
+        if playing and _live_tempo(playing[0]):
+            parameters = _position_parameters(playing[0], time_to_seconds(to_seek))
+        else:
+            parameters = f"-ss {to_seek} -to {duration}"
+        stream = _piped(file_path, mode == "video", parameters, chat_id)
         await assistant.change_stream(chat_id, stream)
 
     async def stream_call(self, link):
@@ -287,26 +358,13 @@ class Call(PyTgCalls):
         link,
         video: Union[bool, str] = None,
         image: Union[bool, str] = None,
+        started: float = None,
     ):
         assistant = await group_assistant(self, chat_id)
         language = await get_lang(chat_id)
         _ = get_string(language)
-        if video:
-            stream = AudioVideoPiped(
-                link,
-                audio_parameters=HighQualityAudio(),
-                video_parameters=MediumQualityVideo(),
-            )
-        else:
-            stream = (
-                AudioVideoPiped(
-                    link,
-                    audio_parameters=HighQualityAudio(),
-                    video_parameters=MediumQualityVideo(),
-                )
-                if video
-                else AudioPiped(link, audio_parameters=HighQualityAudio())
-            )
+        await get_quality(chat_id)
+        stream = _piped(link, bool(video), chat_id=chat_id)
         try:
             await assistant.join_group_call(
                 chat_id,
@@ -316,9 +374,15 @@ class Call(PyTgCalls):
         except NoActiveGroupCall:
             raise AssistantErr(_["call_8"])
         except AlreadyJoinedError:
+            self._joined(assistant, chat_id)
             raise AssistantErr(_["call_9"])
         except TelegramServerError:
+            in_call.pop(chat_id, None)
+            self._record_event(self._number_of(assistant))
             raise AssistantErr(_["call_10"])
+        self._joined(assistant, chat_id)
+        if started:
+            first_audio.append(time.time() - started)
         await add_active_chat(chat_id)
         await Music_on(chat_id)
         if video:
@@ -342,267 +406,424 @@ class Call(PyTgCalls):
             await auto_clean(popped)
             if not check:
                 await _clear_(chat_id)
-                return await client.leave_group_call(chat_id)
+                return await self._leave(client, chat_id)
         except:
             try:
                 await _clear_(chat_id)
-                return await client.leave_group_call(chat_id)
+                return await self._leave(client, chat_id)
             except:
                 return
         else:
-            queued = check[0]["file"]
+            if not await resolve_queue_head(chat_id):
+                await _clear_(chat_id)
+                return await self._leave(client, chat_id)
+            entry = check[0]
+            schedule_prefetch(chat_id)
             language = await get_lang(chat_id)
             _ = get_string(language)
-            title = (check[0]["title"]).title()
-            user = check[0]["by"]
-            original_chat_id = check[0]["chat_id"]
-            streamtype = check[0]["streamtype"]
-            videoid = check[0]["vidid"]
             db[chat_id][0]["played"] = 0
-            exis = (check[0]).get("old_dur")
+            exis = entry.get("old_dur")
             if exis:
                 db[chat_id][0]["dur"] = exis
-                db[chat_id][0]["seconds"] = check[0]["old_second"]
+                db[chat_id][0]["seconds"] = entry["old_second"]
                 db[chat_id][0]["speed_path"] = None
                 db[chat_id][0]["speed"] = 1.0
-            video = True if str(streamtype) == "video" else False
-            if "live_" in queued:
-                n, link = await YouTube.video(videoid, True)
-                if n == 0:
-                    return await app.send_message(
-                        original_chat_id,
-                        text=_["call_6"],
-                    )
-                if video:
-                    stream = AudioVideoPiped(
-                        link,
-                        audio_parameters=HighQualityAudio(),
-                        video_parameters=MediumQualityVideo(),
-                    )
-                else:
-                    stream = AudioPiped(
-                        link,
-                        audio_parameters=HighQualityAudio(),
-                    )
-                try:
-                    await client.change_stream(chat_id, stream)
-                except Exception:
-                    return await app.send_message(
-                        original_chat_id,
-                        text=_["call_6"],
-                    )
-                img = await get_thumb(videoid)
-                button = stream_markup(_, chat_id)
-                run = await app.send_photo(
-                    chat_id=original_chat_id,
-                    photo=img,
-                    caption=_["stream_1"].format(
-                        f"https://t.me/{app.username}?start=info_{videoid}",
-                        title[:23],
-                        check[0]["dur"],
-                        user,
-                    ),
-                    reply_markup=InlineKeyboardMarkup(button),
-                    has_spoiler=True
+            await self.play_queued(chat_id, _, client)
+
+    async def play_queued(self, chat_id: int, _, client=None) -> bool:
+        """
+        Switch the call to the head of the queue and announce it. change_stream,
+        /skip and the skip button all go through here, so a pending announcement
+        of an older track is always cancelled before the new one is posted.
+        """
+        entry = db[chat_id][0]
+        queued = entry["file"]
+        if client is None:
+            client = await group_assistant(self, chat_id)
+        video = True if str(entry["streamtype"]) == "video" else False
+        source, mystic = await self._fetch(entry, video, _)
+        if not source:
+            return False
+        try:
+            await client.change_stream(chat_id, _piped(source, video, chat_id=chat_id))
+        except:
+            self._record_event(self._number_of(client))
+            await app.send_message(entry["chat_id"], text=_["call_6"])
+            return False
+        if "vid_" in queued:
+            entry["markup"] = "stream"
+        elif "live_" in queued or "index_" in queued:
+            entry["markup"] = "tg"
+        elif entry["vidid"] in ("telegram", "soundcloud"):
+            entry["markup"] = "tg"
+        else:
+            entry["markup"] = "stream"
+        self._announce(chat_id, entry, _, mystic)
+        return True
+
+    async def _fetch(self, entry: dict, video: bool, _):
+        """Playable source for a queue entry, plus any "downloading" notice shown meanwhile."""
+        queued = entry["file"]
+        videoid = entry["vidid"]
+        if "live_" in queued:
+            n, link = await YouTube.video(videoid, True)
+            if n == 0:
+                await app.send_message(entry["chat_id"], text=_["call_6"])
+                return None, None
+            return link, None
+        if "vid_" in queued:
+            # Prefetched tracks switch straight away, without a "downloading" notice
+            file_path = YouTube.cached(videoid, video)
+            if file_path:
+                entry["cache_path"] = file_path
+                return file_path, None
+            mystic = await app.send_message(entry["chat_id"], _["call_7"])
+            try:
+                file_path, direct = await YouTube.download(
+                    videoid,
+                    mystic,
+                    videoid=True,
+                    video=video,
                 )
-                db[chat_id][0]["mystic"] = run
-                db[chat_id][0]["markup"] = "tg"
-            elif "vid_" in queued:
-                mystic = await app.send_message(original_chat_id, _["call_7"])
-                try:
-                    file_path, direct = await YouTube.download(
-                        videoid,
-                        mystic,
-                        videoid=True,
-                        video=True if str(streamtype) == "video" else False,
-                    )
-                except:
-                    return await mystic.edit_text(
-                        _["call_6"], disable_web_page_preview=True
-                    )
-                if video:
-                    stream = AudioVideoPiped(
-                        file_path,
-                        audio_parameters=HighQualityAudio(),
-                        video_parameters=MediumQualityVideo(),
-                    )
-                else:
-                    stream = AudioPiped(
-                        file_path,
-                        audio_parameters=HighQualityAudio(),
-                    )
-                try:
-                    await client.change_stream(chat_id, stream)
-                except:
-                    return await app.send_message(
-                        original_chat_id,
-                        text=_["call_6"],
-                    )
-                img = await get_thumb(videoid)
-                button = stream_markup(_, chat_id)
+            except:
+                await mystic.edit_text(_["call_6"], disable_web_page_preview=True)
+                return None, None
+            if os.path.exists(file_path):
+                # Lets the media cache see the file is playing and not evict it
+                entry["cache_path"] = file_path
+            return file_path, mystic
+        if "index_" in queued:
+            return videoid, None
+        return queued, None
+
+    def _announce(self, chat_id: int, entry: dict, _, mystic=None):
+        """Post the now-playing message without holding up the next transition."""
+        task = announcing.pop(chat_id, None)
+        if task:
+            task.cancel()
+        task = asyncio.create_task(self._now_playing(chat_id, entry, _, mystic))
+        announcing[chat_id] = task
+        task.add_done_callback(
+            lambda t: announcing.get(chat_id) is t and announcing.pop(chat_id, None)
+        )
+
+    async def _now_playing(self, chat_id: int, entry: dict, _, mystic=None):
+        queued = entry["file"]
+        videoid = entry["vidid"]
+        user = entry["by"]
+        title = (entry["title"]).title()
+        try:
+            if mystic:
                 await mystic.delete()
-                run = await app.send_photo(
-                    chat_id=original_chat_id,
-                    photo=img,
-                    caption=_["stream_1"].format(
-                        f"https://t.me/{app.username}?start=info_{videoid}",
-                        title[:23],
-                        check[0]["dur"],
-                        user,
-                    ),
-                    reply_markup=InlineKeyboardMarkup(button),
-                    has_spoiler=True
-                )
-                db[chat_id][0]["mystic"] = run
-                db[chat_id][0]["markup"] = "stream"
-            elif "index_" in queued:
-                stream = (
-                    AudioVideoPiped(
-                        videoid,
-                        audio_parameters=HighQualityAudio(),
-                        video_parameters=MediumQualityVideo(),
-                    )
-                    if str(streamtype) == "video"
-                    else AudioPiped(videoid, audio_parameters=HighQualityAudio())
-                )
-                try:
-                    await client.change_stream(chat_id, stream)
-                except:
-                    return await app.send_message(
-                        original_chat_id,
-                        text=_["call_6"],
-                    )
-                button = stream_markup(_, chat_id)
-                run = await app.send_photo(
-                    chat_id=original_chat_id,
-                    photo=config.STREAM_IMG_URL,
-                    caption=_["stream_2"].format(user),
-                    reply_markup=InlineKeyboardMarkup(button),
-                    has_spoiler=True
+            if "index_" in queued:
+                photo = config.STREAM_IMG_URL
+                caption = _["stream_2"].format(user)
+            elif videoid in ("telegram", "soundcloud") and not (
+                "live_" in queued or "vid_" in queued
+            ):
+                if videoid == "soundcloud":
+                    photo = config.SOUNCLOUD_IMG_URL
+                elif str(entry["streamtype"]) == "audio":
+                    photo = config.TELEGRAM_AUDIO_URL
+                else:
+                    photo = config.TELEGRAM_VIDEO_URL
+                caption = _["stream_1"].format(
+                    config.SUPPORT_CHAT, title[:23], entry["dur"], user
                 )
-                db[chat_id][0]["mystic"] = run
-                db[chat_id][0]["markup"] = "tg"
             else:
-                if video:
-                    stream = AudioVideoPiped(
-                        queued,
-                        audio_parameters=HighQualityAudio(),
-                        video_parameters=MediumQualityVideo(),
-                    )
-                else:
-                    stream = AudioPiped(
-                        queued,
-                        audio_parameters=HighQualityAudio(),
-                    )
-                try:
-                    await client.change_stream(chat_id, stream)
-                except:
-                    return await app.send_message(
-                        original_chat_id,
-                        text=_["call_6"],
-                    )
-                if videoid == "telegram":
-                    button = stream_markup(_, chat_id)
-                    run = await app.send_photo(
-                        chat_id=original_chat_id,
-                        photo=config.TELEGRAM_AUDIO_URL
-                        if str(streamtype) == "audio"
-                        else config.TELEGRAM_VIDEO_URL,
-                        caption=_["stream_1"].format(
-                            config.SUPPORT_CHAT, title[:23], check[0]["dur"], user
-                        ),
-                        reply_markup=InlineKeyboardMarkup(button),
-
-                        has_spoiler=True
-                    )
-                    db[chat_id][0]["mystic"] = run
-                    db[chat_id][0]["markup"] = "tg"
-                elif videoid == "soundcloud":
-                    button = stream_markup(_, chat_id)
-                    run = await app.send_photo(
-                        chat_id=original_chat_id,
-                        photo=config.SOUNCLOUD_IMG_URL,
-                        caption=_["stream_1"].format(
-                            config.SUPPORT_CHAT, title[:23], check[0]["dur"], user
-                        ),
-                        reply_markup=InlineKeyboardMarkup(button),
-                        has_spoiler=True
-                    )
-                    db[chat_id][0]["mystic"] = run
-                    db[chat_id][0]["markup"] = "tg"
-                else:
-                    img = await gen_thumb(videoid)
-                    button = stream_markup(_, chat_id)
-                    run = await app.send_photo(
-                        chat_id=original_chat_id,
-                        photo=img,
-                        caption=_["stream_1"].format(
-                            f"https://t.me/{app.username}?start=info_{videoid}",
-                            title[:23],
-                            check[0]["dur"],
-                            user,
-                        ),
-                        reply_markup=InlineKeyboardMarkup(button),
-                        has_spoiler=True
-                    )
-                    db[chat_id][0]["mystic"] = run
-                    db[chat_id][0]["markup"] = "stream"
+                photo = await gen_thumb(videoid)
+                caption = _["stream_1"].format(
+                    f"https://t.me/{app.username}?start=info_{videoid}",
+                    title[:23],
+                    entry["dur"],
+                    user,
+                )
+            button = stream_markup(_, chat_id)
+            run = await app.send_photo(
+                chat_id=entry["chat_id"],
+                photo=photo,
+                caption=caption,
+                reply_markup=InlineKeyboardMarkup(button),
+                has_spoiler=True
+            )
+            entry["mystic"] = run
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            LOGGER(__name__).warning(f"Now playing message for {chat_id} failed: {e}")
 
     async def ping(self):
         pings = []
-        if config.STRING1:
-            pings.append(await self.one.ping)
-        if config.STRING2:
-            pings.append(await self.two.ping)
-        if config.STRING3:
-            pings.append(await self.three.ping)
-        if config.STRING4:
-            pings.append(await self.four.ping)
-        if config.STRING5:
-            pings.append(await self.five.ping)
+        # Assistants whose client never started have no ping to report
+        for number in sorted(started):
+            ping = await self.calls[number].ping
+            assistant_latency[number] = ping
+            pings.append(ping)
         return str(round(sum(pings) / len(pings), 3))
 
+    def assistant_load(self) -> dict:
+        """Per-assistant active calls, ping and placement score."""
+        return get_assistant_loads()
+
+    def _number_of(self, client) -> Optional[int]:
+        for number, call in self.calls.items():
+            if call is client:
+                return number
+        return None
+
+    def _record_event(self, number: Optional[int]):
+        """Count a kick, failed join or failed stream change against an assistant."""
+        if number is None:
+            return
+        events = health.setdefault(number, {"failures": 0, "events": deque()})["events"]
+        events.append(time.monotonic())
+
+    async def _probe(self, number: int) -> bool:
+        state = health.setdefault(number, {"failures": 0, "events": deque()})
+        events = state["events"]
+        while events and events[0] < time.monotonic() - EVENT_WINDOW:
+            events.popleft()
+        client = self.userbots[number]
+        try:
+            if not client.is_connected:
+                raise ConnectionError("client disconnected")
+            await asyncio.wait_for(client.invoke(Ping(ping_id=0)), PING_TIMEOUT)
+            assistant_latency[number] = await asyncio.wait_for(
+                self.calls[number].ping, PING_TIMEOUT
+            )
+            if len(events) >= EVENT_BURST:
+                raise RuntimeError(f"{len(events)} call errors in {EVENT_WINDOW}s")
+        except Exception as e:
+            state["failures"] += 1
+            LOGGER(__name__).warning(
+                f"Assistant {number} health check failed ({state['failures']}): {e}"
+            )
+            return state["failures"] < MAX_FAILURES
+        state["failures"] = 0
+        return True
+
+    async def supervise(self):
+        """Watch assistant health, move calls off failed ones and rebalance."""
+        while not await asyncio.sleep(SUPERVISOR_INTERVAL):
+            for number in sorted(started):
+                healthy = await self._probe(number)
+                if not healthy and number in assistants:
+                    LOGGER(__name__).error(f"Assistant {number} is unhealthy, migrating its calls")
+                    assistants.remove(number)
+                    await self._evacuate(number)
+                elif healthy and number not in assistants and number in started:
+                    LOGGER(__name__).info(f"Assistant {number} is healthy again")
+                    assistants.append(number)
+                    assistants.sort()
+                    rebalancing.add(number)
+            try:
+                await self._rebalance()
+            except Exception as e:
+                LOGGER(__name__).warning(f"Rebalance failed: {e}")
+
+    async def _evacuate(self, number: int):
+        for chat_id in [c for c in active if assistantdict.get(c) == number]:
+            target = least_loaded_assistant(exclude={number}) if assistants else None
+            try:
+                if target is None or target == number:
+                    await run_in_chat(chat_id, self.stop_stream_force, chat_id)
+                else:
+                    await run_in_chat(chat_id, self.migrate, chat_id, target)
+            except Exception as e:
+                LOGGER(__name__).warning(f"Moving {chat_id} off assistant {number} failed: {e}")
+
+    async def _rebalance(self):
+        """Move at most one call per round onto an assistant that came online."""
+        if not rebalancing:
+            return
+        loads = get_assistant_loads()
+        for number in list(rebalancing):
+            if number not in loads:
+                rebalancing.discard(number)
+        if not rebalancing:
+            return
+        busiest = max(loads, key=lambda n: loads[n]["calls"])
+        idlest = min(rebalancing, key=lambda n: loads[n]["calls"])
+        if loads[busiest]["calls"] - loads[idlest]["calls"] < REBALANCE_MARGIN:
+            rebalancing.discard(idlest)
+            return
+        for chat_id in active:
+            if assistantdict.get(chat_id) != busiest:
+                continue
+            playing = db.get(chat_id)
+            if playing and "live_" not in str(playing[0]["file"]):
+                await run_in_chat(chat_id, self.migrate, chat_id, idlest)
+                return
+
+    async def _ensure_member(self, chat_id: int, number: int):
+        client = userbot.get(number)
+        try:
+            await app.get_chat_member(chat_id, client.id)
+            return
+        except UserNotParticipant:
+            pass
+        chat = await app.get_chat(chat_id)
+        invitelink = chat.username or await app.export_chat_invite_link(chat_id)
+        if invitelink.startswith("https://t.me/+"):
+            invitelink = invitelink.replace("https://t.me/+", "https://t.me/joinchat/")
+        try:
+            await client.join_chat(invitelink)
+        except UserAlreadyParticipant:
+            pass
+
+    async def _resume_stream(self, chat_id: int, entry: dict):
+        """A stream for the playing entry that picks up at its current position."""
+        source = entry.get("speed_path") or entry["file"]
+        if "live_" in source or "vid_" in source:
+            video = str(entry["streamtype"]) == "video"
+            source = YouTube.cached(entry["vidid"], video) if "vid_" in source else None
+            if not source:
+                n, source = await YouTube.video(entry["vidid"], True)
+                if n == 0:
+                    return None
+        elif "index_" in source:
+            source = entry["vidid"]
+        ffmpeg = ""
+        if int(entry.get("seconds") or 0) and "live_" not in entry["file"]:
+            ffmpeg = _position_parameters(entry, entry["played"])
+        return _piped(source, str(entry["streamtype"]) == "video", ffmpeg, chat_id)
+
+    async def requality(self, chat_id: int) -> bool:
+        """Restart a chat's stream at its current position with its current profile."""
+        playing = db.get(chat_id)
+        if not playing:
+            return False
+        stream = await self._resume_stream(chat_id, playing[0])
+        if not stream:
+            return False
+        assistant = await group_assistant(self, chat_id)
+        await assistant.change_stream(chat_id, stream)
+        return True
+
+    async def _quality_changed(self, old: int, new: int):
+        for chat_id in list(active):
+            if effective_profile(chat_id, old) == effective_profile(chat_id, new):
+                continue
+            try:
+                await run_in_chat(chat_id, self.requality, chat_id)
+            except Exception as e:
+                LOGGER(__name__).warning(f"Changing quality in {chat_id} failed: {e}")
+
+    async def govern(self):
+        """Step stream quality down under host load and back up when it eases."""
+        await govern(self._quality_changed)
+
+    async def migrate(self, chat_id: int, number: int) -> bool:
+        """Move a chat's call to another assistant, resuming at the current position."""
+        playing = db.get(chat_id)
+        if not playing:
+            return False
+        stream = await self._resume_stream(chat_id, playing[0])
+        if not stream:
+            return False
+        old = assistantdict.get(chat_id)
+        left = False
+        try:
+            await self._ensure_member(chat_id, number)
+            # Switch ownership first so the old assistant's "left" event is ignored
+            assistantdict[chat_id] = number
+            if old in self.calls:
+                try:
+                    await self._leave(self.calls[old], chat_id)
+                except:
+                    pass
+            left = True
+            await self.calls[number].join_group_call(
+                chat_id, stream, stream_type=StreamType().pulse_stream
+            )
+            self._joined(self.calls[number], chat_id)
+        except Exception as e:
+            in_call.pop(chat_id, None)
+            self._record_event(number)
+            LOGGER(__name__).warning(
+                f"Migrating {chat_id} from assistant {old} to {number} failed: {e}"
+            )
+            await self._migration_failed(chat_id, old, stream, left)
+            return False
+        await set_assistant_new(chat_id, number)
+        LOGGER(__name__).info(f"Migrated {chat_id} from assistant {old} to {number}")
+        return True
+
+    async def _migration_failed(self, chat_id: int, old: Optional[int], stream, left: bool):
+        """Put a chat back on its previous assistant, or end its playback if that fails."""
+        if old is not None:
+            assistantdict[chat_id] = old
+        else:
+            assistantdict.pop(chat_id, None)
+        if not left:
+            return
+        if old in self.calls and old in assistants:
+            try:
+                await self.calls[old].join_group_call(
+                    chat_id, stream, stream_type=StreamType().pulse_stream
+                )
+                self._joined(self.calls[old], chat_id)
+                return
+            except Exception as e:
+                LOGGER(__name__).warning(
+                    f"Rejoining {chat_id} with assistant {old} failed, stopping it: {e}"
+                )
+        await self.stop_stream_force(chat_id)
+
     async def start(self):
         LOGGER(__name__).info("Starting PyTgCalls Client...\n")
-        if config.STRING1:
-            await self.one.start()
-        if config.STRING2:
-            await self.two.start()
-        if config.STRING3:
-            await self.three.start()
-        if config.STRING4:
-            await self.four.start()
-        if config.STRING5:
-            await self.five.start()
+        # Only assistants whose account came up can serve calls
+        numbers = [number for number in self.calls if number in assistants]
+        results = await asyncio.gather(
+            *(
+                asyncio.wait_for(self.calls[number].start(), config.ASSISTANT_START_TIMEOUT)
+                for number in numbers
+            ),
+            return_exceptions=True,
+        )
+        for number, result in zip(numbers, results):
+            if isinstance(result, BaseException):
+                LOGGER(__name__).error(
+                    f"PyTgCalls client {number} failed to start, disabling assistant {number}: {result!r}"
+                )
+                assistants.remove(number)
+                try:
+                    await self.userbots[number].stop()
+                except:
+                    pass
+                continue
+            started.add(number)
+            rebalancing.add(number)
+        if not started:
+            LOGGER(__name__).error("No PyTgCalls client could be started, exiting...")
+            exit()
 
     async def decorators(self):
-        @self.one.on_kicked()
-        @self.two.on_kicked()
-        @self.three.on_kicked()
-        @self.four.on_kicked()
-        @self.five.on_kicked()
-        @self.one.on_closed_voice_chat()
-        @self.two.on_closed_voice_chat()
-        @self.three.on_closed_voice_chat()
-        @self.four.on_closed_voice_chat()
-        @self.five.on_closed_voice_chat()
-        @self.one.on_left()
-        @self.two.on_left()
-        @self.three.on_left()
-        @self.four.on_left()
-        @self.five.on_left()
-        async def stream_services_handler(_, chat_id: int):
-            await self.stop_stream(chat_id)
-
-        @self.one.on_stream_end()
-        @self.two.on_stream_end()
-        @self.three.on_stream_end()
-        @self.four.on_stream_end()
-        @self.five.on_stream_end()
+        async def stream_services_handler(client, chat_id: int):
+            number = self._number_of(client)
+            if in_call.get(chat_id) == number:
+                in_call[chat_id] = None
+            if number is not None and assistantdict.get(chat_id) not in (None, number):
+                # Left by a migration: the chat is already served by another assistant
+                return
+            await run_in_chat(chat_id, self.stop_stream, chat_id)
+
+        async def stream_kicked_handler(client, chat_id: int):
+            # Closed voice chats and normal leaves are routine; only kicks count
+            if assistantdict.get(chat_id) in (None, self._number_of(client)):
+                self._record_event(self._number_of(client))
+            await stream_services_handler(client, chat_id)
+
         async def stream_end_handler1(client, update: Update):
             if not isinstance(update, StreamAudioEnded):
                 return
-            await self.change_stream(client, update.chat_id)
+            await run_in_chat(update.chat_id, self.change_stream, client, update.chat_id)
+
+        for call in self.calls.values():
+            call.on_kicked()(stream_kicked_handler)
+            call.on_closed_voice_chat()(stream_services_handler)
+            call.on_left()(stream_services_handler)
+            call.on_stream_end()(stream_end_handler1)
 
 
 Ritik = Call()
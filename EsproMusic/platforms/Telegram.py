@@ -8,11 +8,11 @@ from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Voice
 import config
 from EsproMusic import app
 from EsproMusic.utils.formatters import (
-    check_duration,
     convert_bytes,
     get_readable_time,
     seconds_to_min,
 )
+from EsproMusic.utils.process import probe_duration
 
 
 class TeleAPI:
@@ -54,9 +54,7 @@ class TeleAPI:
             dur = seconds_to_min(filex.duration)
         except:
             try:
-                dur = await asyncio.get_event_loop().run_in_executor(
-                    None, check_duration, file_path
-                )
+                dur = await probe_duration(file_path)
                 dur = seconds_to_min(dur)
             except:
                 return "Unknown"
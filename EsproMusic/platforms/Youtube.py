@@ -1,22 +1,107 @@
 import asyncio
 import os
+import random
 import re
-from typing import Union, Optional
+import shutil
+import time
+import weakref
+from collections import deque
+from dataclasses import dataclass
+from typing import List, Union, Optional
 import httpx
 
 from pyrogram.enums import MessageEntityType
 from pyrogram.types import Message
 from youtubesearchpython.__future__ import VideosSearch
 
+from EsproMusic.logging import LOGGER
+from EsproMusic.utils.cache import SingleFlight, TTLCache
 from EsproMusic.utils.formatters import time_to_seconds
-from config import API_KEY
+from EsproMusic.utils.limiter import PRIORITY_BACKGROUND, PRIORITY_PLAYING, PriorityLimiter
+from EsproMusic.utils.mediacache import media_cache
+from EsproMusic.utils.stream.normalize import schedule_normalize
+from EsproMusic.utils.stream.policy import (
+    DOWNLOAD,
+    PROGRESSIVE,
+    STREAM,
+    can_play_progressive,
+    choose_mode,
+)
+from config import API_KEY, DOWNLOAD_CONCURRENCY
 # API Configuration
 API_BASE_URL = "https://youtubify.me"
 
 # Streaming configuration
 ENABLE_STREAMING = True  # Enable streaming URLs for VC (no file size limit)
 MAX_DOWNLOAD_SIZE_MB = 48  # Only download files smaller than this (for direct uploads)
-STREAM_MODE_DURATION_THRESHOLD = 1200  # 20 minutes - files longer than this will use streaming URLs
+VIDEO_MAX_RES = 720
+# Start playing audio once this many bytes are on disk instead of waiting for the whole file
+PROGRESSIVE_PLAYBACK = True
+PROGRESSIVE_BUFFER = 1024 * 1024  # ~60s of 128kbps audio
+# ffmpeg waits this long at the end of a still-growing file before treating it as the end
+PROGRESSIVE_STALL_TIMEOUT = 15
+
+# Shared HTTP client configuration
+# Every request goes to API_BASE_URL, so the pool limits are effectively per host.
+HTTP_MAX_CONNECTIONS = 50
+HTTP_MAX_KEEPALIVE = 20
+HTTP_KEEPALIVE_EXPIRY = 60.0
+
+# Download retry configuration
+DOWNLOAD_RETRIES = 5
+DOWNLOAD_BACKOFF = 1.0  # seconds, doubled on every retry
+DOWNLOAD_BACKOFF_MAX = 20.0
+
+# Metadata cache configuration
+META_CACHE_SIZE = 2048
+META_CACHE_TTL = 6 * 3600
+SEARCH_CACHE_SIZE = 256
+SEARCH_CACHE_TTL = 15 * 60
+
+try:
+    import h2  # noqa: F401
+
+    HTTP2_ENABLED = True
+except ImportError:
+    HTTP2_ENABLED = False
+
+
+class IncompleteDownload(Exception):
+    pass
+
+
+def _content_range_total(value: Optional[str]) -> Optional[int]:
+    """Total size from a "bytes start-end/total" Content-Range header."""
+    if not value or "/" not in value:
+        return None
+    total = value.rsplit("/", 1)[1]
+    return int(total) if total.isdigit() else None
+
+
+@dataclass(frozen=True)
+class VideoMeta:
+    vidid: str
+    title: str
+    duration_min: Optional[str]
+    duration_sec: int
+    thumbnail: str
+    link: str
+
+    @classmethod
+    def from_result(cls, result: dict) -> "VideoMeta":
+        duration_min = result["duration"]
+        if str(duration_min) == "None":
+            duration_sec = 0
+        else:
+            duration_sec = int(time_to_seconds(duration_min))
+        return cls(
+            vidid=result["id"],
+            title=result["title"],
+            duration_min=duration_min,
+            duration_sec=duration_sec,
+            thumbnail=result["thumbnails"][0]["url"].split("?")[0],
+            link=result["link"],
+        )
 
 
 class YouTubeAPI:
@@ -26,6 +111,71 @@ class YouTubeAPI:
         self.status = "https://www.youtube.com/oembed?url="
         self.listbase = "https://youtube.com/playlist?list="
         self.reg = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
+        self._client: Optional[httpx.AsyncClient] = None
+        self._requests = 0
+        self._new_connections = 0
+        self._seen_connections = weakref.WeakSet()
+        self._meta = TTLCache(maxsize=META_CACHE_SIZE, ttl=META_CACHE_TTL)
+        self._searches = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+        self._downloads = SingleFlight()
+        self._limiter = PriorityLimiter(DOWNLOAD_CONCURRENCY)
+        self._attempts = deque(maxlen=200)
+        self._growing = {}
+        self._expected_duration = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Process-wide pooled client, created lazily on first use."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_ENABLED,
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(10.0),
+                event_hooks={"response": [self._track_connection]},
+            )
+        return self._client
+
+    def _pool(self):
+        transport = getattr(self._client, "_transport", None)
+        return getattr(transport, "_pool", None)
+
+    async def _track_connection(self, response: httpx.Response):
+        self._requests += 1
+        pool = self._pool()
+        if pool is None:
+            return
+        for connection in list(getattr(pool, "connections", [])):
+            if connection not in self._seen_connections:
+                self._seen_connections.add(connection)
+                self._new_connections += 1
+
+    def pool_stats(self) -> dict:
+        """Open connections, queued requests and connection reuse ratio."""
+        pool = self._pool()
+        connections = list(getattr(pool, "connections", [])) if pool else []
+        waiting = [
+            r for r in getattr(pool, "_requests", []) if getattr(r, "connection", None) is None
+        ] if pool else []
+        reused = max(self._requests - self._new_connections, 0)
+        return {
+            "http2": HTTP2_ENABLED,
+            "open_connections": len(connections),
+            "idle_connections": len([c for c in connections if c.is_idle()]),
+            "waiters": len(waiting),
+            "requests": self._requests,
+            "new_connections": self._new_connections,
+            "reuse_ratio": round(reused / self._requests, 3) if self._requests else 0.0,
+        }
+
+    async def close(self):
+        media_cache.save()
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
 
     async def exists(self, link: str, videoid: Union[bool, str] = None):
         if videoid:
@@ -59,52 +209,66 @@ class YouTubeAPI:
             return None
         return text[offset : offset + length]
 
-    async def details(self, link: str, videoid: Union[bool, str] = None):
+    def video_id(self, link: str) -> Optional[str]:
+        """Canonical video ID of a YouTube link, or None for free-text queries."""
+        if not re.search(self.regex, link):
+            return None
+        match = re.search(r"(?:v=|youtu\.be/|shorts/|live/|embed/)([\w-]{11})", link)
+        if match:
+            return match.group(1)
+        return link.split("v=")[-1].split("&")[0] if "v=" in link else link.split("/")[-1].split("?")[0]
+
+    async def _search(self, query: str, limit: int) -> List[VideoMeta]:
+        results = VideosSearch(query, limit=limit)
+        metas = [VideoMeta.from_result(r) for r in (await results.next())["result"]]
+        for meta in metas:
+            self._meta.set(meta.vidid, meta)
+        return metas
+
+    async def meta(self, link: str, videoid: Union[bool, str] = None) -> VideoMeta:
+        """Resolve a link, video ID or search query to a cached VideoMeta."""
         if videoid:
             link = self.base + link
         if "&" in link:
             link = link.split("&")[0]
-        results = VideosSearch(link, limit=1)
-        for result in (await results.next())["result"]:
-            title = result["title"]
-            duration_min = result["duration"]
-            thumbnail = result["thumbnails"][0]["url"].split("?")[0]
-            vidid = result["id"]
-            if str(duration_min) == "None":
-                duration_sec = 0
-            else:
-                duration_sec = int(time_to_seconds(duration_min))
-        return title, duration_min, duration_sec, thumbnail, vidid
+        vid = self.video_id(link)
+        key = vid or f"q:{link}"
+
+        async def _resolve():
+            metas = await self._search(link, 1)
+            if not metas:
+                raise LookupError(f"No results found for {link}")
+            return metas[0]
+
+        return await self._meta.get_or_load(key, _resolve)
+
+    def peek_meta(self, vidid: str) -> Optional[VideoMeta]:
+        """Already-resolved metadata for a video ID, without any network call."""
+        return self._meta.peek(vidid)
+
+    def meta_stats(self) -> dict:
+        return {"meta": self._meta.stats(), "search": self._searches.stats()}
+
+    def download_stats(self) -> dict:
+        return {
+            "inflight": len(self._downloads),
+            "limiter": self._limiter.stats(),
+            "cache": media_cache.stats(),
+            "attempts": self.attempt_stats(),
+        }
+
+    async def details(self, link: str, videoid: Union[bool, str] = None):
+        meta = await self.meta(link, videoid)
+        return meta.title, meta.duration_min, meta.duration_sec, meta.thumbnail, meta.vidid
 
     async def title(self, link: str, videoid: Union[bool, str] = None):
-        if videoid:
-            link = self.base + link
-        if "&" in link:
-            link = link.split("&")[0]
-        results = VideosSearch(link, limit=1)
-        for result in (await results.next())["result"]:
-            title = result["title"]
-        return title
+        return (await self.meta(link, videoid)).title
 
     async def duration(self, link: str, videoid: Union[bool, str] = None):
-        if videoid:
-            link = self.base + link
-        if "&" in link:
-            link = link.split("&")[0]
-        results = VideosSearch(link, limit=1)
-        for result in (await results.next())["result"]:
-            duration = result["duration"]
-        return duration
+        return (await self.meta(link, videoid)).duration_min
 
     async def thumbnail(self, link: str, videoid: Union[bool, str] = None):
-        if videoid:
-            link = self.base + link
-        if "&" in link:
-            link = link.split("&")[0]
-        results = VideosSearch(link, limit=1)
-        for result in (await results.next())["result"]:
-            thumbnail = result["thumbnails"][0]["url"].split("?")[0]
-        return thumbnail
+        return (await self.meta(link, videoid)).thumbnail
 
     async def video(self, link: str, videoid: Union[bool, str] = None):
         """Get video stream URL via API"""
@@ -157,38 +321,31 @@ class YouTubeAPI:
         playlist_id = link.split("list=")[-1].split("&")[0] if "list=" in link else ""
         
         try:
-            async with httpx.AsyncClient(timeout=httpx.Timeout(connect=5.0, read=15.0)) as client:
-                url = f"{API_BASE_URL}/playlist"
-                params = {"playlist_id": playlist_id, "limit": limit, "api_key": API_KEY}
-                r = await client.get(url, params=params)
-                if r.status_code == 200:
-                    data = r.json()
-                    return data.get("video_ids", [])
+            url = f"{API_BASE_URL}/playlist"
+            params = {"playlist_id": playlist_id, "limit": limit, "api_key": API_KEY}
+            r = await self.client.get(
+                url,
+                params=params,
+                timeout=httpx.Timeout(10.0, connect=5.0, read=15.0),
+            )
+            if r.status_code == 200:
+                data = r.json()
+                return data.get("video_ids", [])
         except Exception:
             pass
         
         return []
 
     async def track(self, link: str, videoid: Union[bool, str] = None):
-        if videoid:
-            link = self.base + link
-        if "&" in link:
-            link = link.split("&")[0]
-        results = VideosSearch(link, limit=1)
-        for result in (await results.next())["result"]:
-            title = result["title"]
-            duration_min = result["duration"]
-            vidid = result["id"]
-            yturl = result["link"]
-            thumbnail = result["thumbnails"][0]["url"].split("?")[0]
+        meta = await self.meta(link, videoid)
         track_details = {
-            "title": title,
-            "link": yturl,
-            "vidid": vidid,
-            "duration_min": duration_min,
-            "thumb": thumbnail,
+            "title": meta.title,
+            "link": meta.link,
+            "vidid": meta.vidid,
+            "duration_min": meta.duration_min,
+            "thumb": meta.thumbnail,
         }
-        return track_details, vidid
+        return track_details, meta.vidid
 
     async def formats(self, link: str, videoid: Union[bool, str] = None):
         """Get available formats via API"""
@@ -201,13 +358,16 @@ class YouTubeAPI:
         vid = link.split("v=")[-1].split("&")[0] if "v=" in link else link.split("/")[-1].split("?")[0]
         
         try:
-            async with httpx.AsyncClient(timeout=httpx.Timeout(connect=5.0, read=10.0)) as client:
-                url = f"{API_BASE_URL}/formats"
-                params = {"video_id": vid, "api_key": API_KEY}
-                r = await client.get(url, params=params)
-                if r.status_code == 200:
-                    data = r.json()
-                    return data.get("formats", []), link
+            url = f"{API_BASE_URL}/formats"
+            params = {"video_id": vid, "api_key": API_KEY}
+            r = await self.client.get(
+                url,
+                params=params,
+                timeout=httpx.Timeout(10.0, connect=5.0, read=10.0),
+            )
+            if r.status_code == 200:
+                data = r.json()
+                return data.get("formats", []), link
         except Exception:
             pass
         
@@ -223,13 +383,9 @@ class YouTubeAPI:
             link = self.base + link
         if "&" in link:
             link = link.split("&")[0]
-        a = VideosSearch(link, limit=10)
-        result = (await a.next()).get("result")
-        title = result[query_type]["title"]
-        duration_min = result[query_type]["duration"]
-        vidid = result[query_type]["id"]
-        thumbnail = result[query_type]["thumbnails"][0]["url"].split("?")[0]
-        return title, duration_min, thumbnail, vidid
+        result = await self._searches.get_or_load(link, lambda: self._search(link, 10))
+        meta = result[query_type]
+        return meta.title, meta.duration_min, meta.thumbnail, meta.vidid
 
     async def download(
         self,
@@ -246,8 +402,9 @@ class YouTubeAPI:
         Download audio or video using API.
         
         Returns:
-            - For streaming (long videos): Returns streaming URL as string
-            - For downloads (short videos): Returns (filepath, True) tuple
+            - For streaming (large files, low disk, slow links): (streaming URL, True)
+            - For downloads: (filepath, True)
+            - For song downloads (songaudio/songvideo): filepath
         """
         if videoid:
             link = self.base + link
@@ -255,158 +412,291 @@ class YouTubeAPI:
         # Extract video ID from link
         vid = link.split("v=")[-1].split("&")[0] if "v=" in link else link.split("/")[-1].split("?")[0]
         
-        # Check video duration to decide streaming vs download
-        duration_seconds = 0
-        try:
-            async with httpx.AsyncClient(timeout=httpx.Timeout(10.0)) as client:
-                info_resp = await client.get(
-                    f"{API_BASE_URL}/info",
-                    params={"video_id": vid, "api_key": API_KEY}
+        # Already downloaded (or just finished by another chat): skip the /info lookup
+        cached = self.cached(vid, bool(video))
+        if cached and not (songvideo or songaudio):
+            return cached, True
+
+        # Decide between streaming and downloading, reusing metadata we already have
+        if songvideo or songaudio:
+            mode = DOWNLOAD
+        else:
+            meta = self.peek_meta(vid)
+            duration_seconds = meta.duration_sec if meta else await self._info_duration(vid)
+            throughput = self.attempt_stats()["throughput"]
+            mode, _ = choose_mode(
+                vid,
+                duration_seconds,
+                bool(video),
+                throughput,
+                progressive=PROGRESSIVE_PLAYBACK,
+            )
+            if mode == STREAM and not ENABLE_STREAMING:
+                progressive = (
+                    PROGRESSIVE_PLAYBACK and not video and can_play_progressive(throughput)
                 )
-                if info_resp.status_code == 200:
-                    info_data = info_resp.json()
-                    duration_str = info_data.get("duration", "0:0")
-                    # Parse duration
-                    parts = duration_str.split(":")
-                    if len(parts) == 3:
-                        duration_seconds = int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
-                    elif len(parts) == 2:
-                        duration_seconds = int(parts[0]) * 60 + int(parts[1])
-                    else:
-                        duration_seconds = int(parts[0])
-        except Exception as e:
-            print(f"Failed to get duration: {e}")
-        
-        # For long videos (>20 min), return streaming URL instead of downloading
-        if ENABLE_STREAMING and duration_seconds > STREAM_MODE_DURATION_THRESHOLD:
-            # Return streaming URL for VC playback
+                mode = PROGRESSIVE if progressive else DOWNLOAD
+
+        if mode == STREAM:
             # Use redirect mode (default) which gives YouTube's direct URL - works with FFmpeg
-            if video:
-                stream_url = f"{API_BASE_URL}/download/video?video_id={vid}&max_res=720&api_key={API_KEY}"
-            else:
-                stream_url = f"{API_BASE_URL}/download/audio?video_id={vid}&api_key={API_KEY}"
-            
-            print(f"Using streaming URL for long video ({duration_seconds}s): {stream_url}")
-            return stream_url  # Return URL directly for streaming
-        
-        # For short videos, download as before
-        # Use API for downloads
-        async def api_download_audio():
-            """Download audio using the API"""
-            try:
-                async with httpx.AsyncClient(
-                    timeout=httpx.Timeout(connect=10.0, read=600.0, write=600.0, pool=10.0),
-                    follow_redirects=True
-                ) as client:
-                    url = f"{API_BASE_URL}/download/audio"
-                    params = {
-                        "video_id": vid,
-                        "mode": "download",
-                        "no_redirect": "1",
-                        "api_key": API_KEY
-                    }
-                    
-                    # Get filename first
-                    info_resp = await client.get(f"{API_BASE_URL}/info", params={"video_id": vid, "api_key": API_KEY})
-                    if info_resp.status_code == 200:
-                        info_data = info_resp.json()
-                        file_title = info_data.get("title", vid)
-                    else:
-                        file_title = vid
-                    
-                    # Sanitize filename
-                    safe_title = re.sub(r'[<>:"/\\|?*]', '', file_title)[:100]
-                    filepath = f"downloads/{safe_title}.mp3"
-                    
-                    # Download file
-                    async with client.stream("GET", url, params=params) as r:
-                        if r.status_code != 200:
-                            raise Exception(f"API returned {r.status_code}")
-                        
-                        os.makedirs("downloads", exist_ok=True)
-                        with open(filepath, "wb") as f:
-                            async for chunk in r.aiter_bytes(chunk_size=1024 * 128):
-                                if chunk:
-                                    f.write(chunk)
-                    
-                    return filepath
-            except Exception as e:
-                print(f"API audio download failed: {e}")
-                return None
-        
-        async def api_download_video():
-            """Download video using the API"""
-            try:
-                async with httpx.AsyncClient(
-                    timeout=httpx.Timeout(connect=10.0, read=600.0, write=600.0, pool=10.0),
-                    follow_redirects=True
-                ) as client:
-                    url = f"{API_BASE_URL}/download/video"
-                    params = {
-                        "video_id": vid,
-                        "mode": "download",
-                        "no_redirect": "1",
-                        "max_res": "720",
-                        "api_key": API_KEY
-                    }
-                    
-                    # Get filename first
-                    info_resp = await client.get(f"{API_BASE_URL}/info", params={"video_id": vid, "api_key": API_KEY})
-                    if info_resp.status_code == 200:
-                        info_data = info_resp.json()
-                        file_title = info_data.get("title", vid)
-                    else:
-                        file_title = vid
-                    
-                    # Sanitize filename
-                    safe_title = re.sub(r'[<>:"/\\|?*]', '', file_title)[:100]
-                    filepath = f"downloads/{safe_title}.mp4"
-                    
-                    # Download file
-                    async with client.stream("GET", url, params=params) as r:
-                        if r.status_code != 200:
-                            raise Exception(f"API returned {r.status_code}")
-                        
-                        os.makedirs("downloads", exist_ok=True)
-                        with open(filepath, "wb") as f:
-                            async for chunk in r.aiter_bytes(chunk_size=1024 * 128):
-                                if chunk:
-                                    f.write(chunk)
-                    
-                    return filepath
-            except Exception as e:
-                print(f"API video download failed: {e}")
-                return None
+            return await self.stream_url(vid, True, bool(video)), True
+
+        # Download into the media cache (or reuse a cached copy)
+        filepath = await self._download_media(
+            vid,
+            bool(video),
+            progressive=mode == PROGRESSIVE,
+            duration=duration_seconds if mode == PROGRESSIVE else 0,
+        )
 
         # Handle special song download cases (custom format_id)
         if songvideo or songaudio:
-            # For custom format downloads, fall back to video/audio download
-            if songvideo:
-                downloaded_file = await api_download_video()
-                if downloaded_file:
-                    fpath = f"downloads/{title}.mp4" if title else downloaded_file
-                    if downloaded_file != fpath and os.path.exists(downloaded_file):
-                        os.rename(downloaded_file, fpath)
-                    return fpath
-            else:  # songaudio
-                downloaded_file = await api_download_audio()
-                if downloaded_file:
-                    fpath = f"downloads/{title}.mp3" if title else downloaded_file
-                    if downloaded_file != fpath and os.path.exists(downloaded_file):
-                        os.rename(downloaded_file, fpath)
-                    return fpath
+            ext = "mp4" if songvideo else "mp3"
+            fpath = f"downloads/{title}.{ext}" if title else filepath
+            if fpath != filepath:
+                # Song uploads get their own copy so the cached entry stays intact
+                shutil.copyfile(filepath, fpath)
+            return fpath
+
+        return filepath, True
+
+    def media_key(self, vid: str, video: bool) -> tuple:
+        return (vid, "video" if video else "audio", VIDEO_MAX_RES if video else 0)
+
+    def cached(self, vid: str, video: bool) -> Optional[str]:
+        """Path of an already downloaded copy, if any."""
+        return media_cache.get(self.media_key(vid, video))
+
+    def growing_duration(self, path: str) -> Optional[int]:
+        """
+        Expected duration in seconds (0 if unknown) while `path` is a progressive
+        download that is still being written; None once it is complete.
+        """
+        for key in list(self._growing):
+            if media_cache.path_for(key, "mp4" if key[1] == "video" else "mp3") == path:
+                return self._expected_duration.get(key, 0)
+        return None
+
+    async def prefetch(self, vid: str, video: bool = False) -> Optional[str]:
+        """Download an upcoming track in the background, below playback priority."""
+        meta = await self.meta(vid, True)
+        if not meta.duration_sec:
             return None
-        
-        # Standard video or audio download
-        if video:
-            # Download video
-            downloaded_file = await api_download_video()
-            if downloaded_file and os.path.exists(downloaded_file):
-                return downloaded_file, True
-            return None, True
-        else:
-            # Download audio
-            downloaded_file = await api_download_audio()
-            if downloaded_file and os.path.exists(downloaded_file):
-                return downloaded_file, True
-            return None, True
+        mode, _ = choose_mode(
+            vid,
+            meta.duration_sec,
+            video,
+            self.attempt_stats()["throughput"],
+            progressive=False,
+        )
+        if mode == STREAM and ENABLE_STREAMING:
+            return None
+        return await self._download_media(vid, video, PRIORITY_BACKGROUND)
+
+    async def _info_duration(self, vid: str) -> int:
+        """Duration from the API's /info endpoint, for videos we have no metadata for."""
+        duration_seconds = 0
+        try:
+            info_resp = await self.client.get(
+                f"{API_BASE_URL}/info",
+                params={"video_id": vid, "api_key": API_KEY}
+            )
+            if info_resp.status_code == 200:
+                info_data = info_resp.json()
+                duration_seconds = int(time_to_seconds(info_data.get("duration") or "0"))
+        except Exception as e:
+            LOGGER(__name__).warning(f"Failed to get duration of {vid}: {e}")
+        return duration_seconds
+
+    async def _download_media(
+        self,
+        vid: str,
+        video: bool,
+        priority: int = PRIORITY_PLAYING,
+        progressive: bool = False,
+        duration: int = 0,
+    ) -> str:
+        """
+        Return a cached file for the video, downloading it on a cache miss.
+
+        Concurrent requests for the same media key share one download; if it
+        fails, every waiter gets the same exception and no partial file is kept.
+        With `progressive`, the path is returned as soon as PROGRESSIVE_BUFFER
+        bytes are on disk while the rest keeps downloading in the background;
+        `duration` (seconds, if known) tells playback where that file ends.
+        """
+        key = self.media_key(vid, video)
+        ext = "mp4" if video else "mp3"
+        cached = media_cache.get(key)
+        if cached:
+            return cached
+        if key in self._downloads:
+            if priority == PRIORITY_PLAYING:
+                # A queued prefetch became the current track: let it jump the queue.
+                self._limiter.promote(key, priority)
+            # Only a download started in progressive mode writes to a readable path
+            progressive = progressive and key in self._growing
+        elif progressive:
+            self._growing[key] = asyncio.Event()
+            if duration:
+                self._expected_duration[key] = duration
+        task = asyncio.ensure_future(
+            self._downloads.do(key, lambda: self._fetch_media(key, ext, priority))
+        )
+        if not progressive:
+            return await task
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        ready = asyncio.ensure_future(self._growing[key].wait())
+        done, _ = await asyncio.wait({task, ready}, return_when=asyncio.FIRST_COMPLETED)
+        ready.cancel()
+        path = media_cache.path_for(key, ext)
+        if task in done or not os.path.exists(path):
+            return await task
+        return path
+
+    async def _fetch_media(self, key: tuple, ext: str, priority: int) -> str:
+        try:
+            async with self._limiter.slot(priority, key):
+                # A download that finished while we were queued counts as a hit
+                cached = media_cache.get(key)
+                if cached:
+                    return cached
+                return await self._fetch_to_cache(key, ext, self._growing.get(key))
+        finally:
+            self._expected_duration.pop(key, None)
+            ready = self._growing.pop(key, None)
+            if ready:
+                ready.set()
+
+    async def _fetch_to_cache(
+        self, key: tuple, ext: str, ready: Optional[asyncio.Event] = None
+    ) -> str:
+        """
+        Download into a temp file, resuming with Range requests after failures.
+
+        Transient errors are retried with exponential backoff and full jitter;
+        the finished file must match the size the server reported. Progressive
+        downloads (`ready` given) write straight to the final path so ffmpeg can
+        read it while it grows; the entry is only indexed once complete.
+        """
+        vid, kind, max_res = key
+        params = {
+            "video_id": vid,
+            "mode": "download",
+            "no_redirect": "1",
+            "api_key": API_KEY,
+        }
+        if kind == "video":
+            params["max_res"] = str(max_res)
+        url = f"{API_BASE_URL}/download/{kind}"
+        temp = media_cache.path_for(key, ext) if ready else media_cache.temp_path(key, ext)
+        try:
+            for attempt in range(1, DOWNLOAD_RETRIES + 1):
+                offset = os.path.getsize(temp) if os.path.exists(temp) else 0
+                started = time.monotonic()
+                error = None
+                try:
+                    await self._fetch_range(url, params, temp, offset, ready)
+                    break
+                except (httpx.TransportError, httpx.HTTPStatusError, IncompleteDownload) as e:
+                    error = e
+                    if attempt == DOWNLOAD_RETRIES:
+                        raise
+                finally:
+                    self._attempts.append(
+                        {
+                            "vid": vid,
+                            "kind": kind,
+                            "attempt": attempt,
+                            "offset": offset,
+                            "bytes": (os.path.getsize(temp) if os.path.exists(temp) else 0) - offset,
+                            "seconds": round(time.monotonic() - started, 3),
+                            "error": repr(error) if error else None,
+                        }
+                    )
+                delay = min(DOWNLOAD_BACKOFF_MAX, DOWNLOAD_BACKOFF * 2 ** (attempt - 1))
+                if ready is not None:
+                    # Playback is waiting on this file: retry well before ffmpeg gives up
+                    delay = min(delay, PROGRESSIVE_STALL_TIMEOUT / 3)
+                LOGGER(__name__).warning(
+                    f"API {kind} download of {vid} failed ({error}), retrying..."
+                )
+                await asyncio.sleep(random.uniform(0, delay))
+            path = media_cache.commit(key, temp, ext)
+            if kind == "audio":
+                schedule_normalize(path)
+            return path
+        except BaseException as e:
+            media_cache.discard(temp)
+            LOGGER(__name__).error(f"API {kind} download of {vid} failed: {e}")
+            raise
+
+    async def _fetch_range(
+        self,
+        url: str,
+        params: dict,
+        path: str,
+        offset: int,
+        ready: Optional[asyncio.Event] = None,
+    ):
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        async with self.client.stream(
+            "GET",
+            url,
+            params=params,
+            headers=headers,
+            timeout=httpx.Timeout(10.0, read=60.0, write=60.0),
+            follow_redirects=True,
+        ) as r:
+            if r.status_code == 416 and offset:
+                # Nothing left to fetch; the size check below still applies
+                total = _content_range_total(r.headers.get("content-range"))
+                if total is None or total == offset:
+                    return
+                if ready is not None:
+                    # ffmpeg may be reading this file: fail rather than truncate it
+                    raise Exception(f"expected {total} bytes, had {offset}")
+                # Local data doesn't match the remote file: restart from scratch
+                open(path, "wb").close()
+                raise IncompleteDownload(f"expected {total} bytes, had {offset}")
+            if r.status_code >= 500 or r.status_code == 429:
+                raise httpx.HTTPStatusError(
+                    f"API returned {r.status_code}", request=r.request, response=r
+                )
+            skip = 0
+            if r.status_code == 206:
+                total = _content_range_total(r.headers.get("content-range"))
+            elif r.status_code == 200:
+                # Server ignored the Range header: drop the bytes we already have
+                # instead of truncating a file ffmpeg may already be reading
+                length = r.headers.get("content-length")
+                total = int(length) if length and length.isdigit() else None
+                skip = offset
+            else:
+                raise Exception(f"API returned {r.status_code}")
+            with open(path, "ab") as f:
+                async for chunk in r.aiter_bytes(chunk_size=1024 * 128):
+                    if skip:
+                        dropped = min(skip, len(chunk))
+                        chunk, skip = chunk[dropped:], skip - dropped
+                    if chunk:
+                        f.write(chunk)
+                        if ready is not None:
+                            f.flush()
+                            if not ready.is_set() and f.tell() >= PROGRESSIVE_BUFFER:
+                                ready.set()
+        size = os.path.getsize(path)
+        if total is not None and size != total:
+            raise IncompleteDownload(f"expected {total} bytes, got {size}")
+
+    def attempt_stats(self) -> dict:
+        """Summary of recent download attempts, for spotting a flaky upstream."""
+        attempts = list(self._attempts)
+        failed = [a for a in attempts if a["error"]]
+        seconds = sum(a["seconds"] for a in attempts)
+        return {
+            "attempts": len(attempts),
+            "failed": len(failed),
+            "resumed": len([a for a in attempts if a["offset"]]),
+            "throughput": round(sum(a["bytes"] for a in attempts) / seconds) if seconds else 0,
+        }
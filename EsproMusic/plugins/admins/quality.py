@@ -0,0 +1,35 @@
+from pyrogram import filters
+from pyrogram.types import Message
+
+from EsproMusic import app
+from EsproMusic.core.call import Ritik
+from EsproMusic.utils.database import get_quality, is_active_chat, set_quality
+from EsproMusic.utils.decorators import AdminRightsCheck
+from EsproMusic.utils.inline import close_markup
+from EsproMusic.utils.stream.actor import serialized
+from EsproMusic.utils.stream.quality import LEVELS, effective_profile
+from config import BANNED_USERS
+
+
+@app.on_message(
+    filters.command(["quality", "cquality"]) & filters.group & ~BANNED_USERS
+)
+@AdminRightsCheck
+@serialized
+async def quality(cli, message: Message, _, chat_id):
+    if len(message.command) != 2 or message.command[1].lower() not in LEVELS:
+        current = await get_quality(chat_id)
+        return await message.reply_text(
+            _["admin_41"].format(current, effective_profile(chat_id), " | ".join(LEVELS))
+        )
+    profile = message.command[1].lower()
+    await set_quality(chat_id, profile)
+    if await is_active_chat(chat_id):
+        try:
+            await Ritik.requality(chat_id)
+        except:
+            pass
+    await message.reply_text(
+        _["admin_42"].format(profile, message.from_user.mention),
+        reply_markup=close_markup(_),
+    )
@@ -47,9 +47,15 @@ async def seek_comm(cli, message: Message, _, chat_id):
         to_seek = duration_played + duration_to_skip + 1
     mystic = await message.reply_text(_["admin_24"])
     if "vid_" in file_path:
-        n, file_path = await YouTube.video(playing[0]["vidid"], True)
-        if n == 0:
-            return await message.reply_text(_["admin_22"])
+        video = str(playing[0]["streamtype"]) == "video"
+        # Seek within the downloaded copy; only fetch a stream URL on a cache miss
+        cached = YouTube.cached(playing[0]["vidid"], video)
+        if cached:
+            file_path = cached
+        else:
+            n, file_path = await YouTube.video(playing[0]["vidid"], True)
+            if n == 0:
+                return await message.reply_text(_["admin_22"])
     check = (playing[0]).get("speed_path")
     if check:
         file_path = check
@@ -7,6 +7,7 @@ from EsproMusic import app
 from EsproMusic.misc import db
 from EsproMusic.utils.decorators import AdminRightsCheck
 from EsproMusic.utils.inline import close_markup
+from EsproMusic.utils.stream.actor import serialized
 from config import BANNED_USERS
 
 
@@ -14,6 +15,7 @@ from config import BANNED_USERS
     filters.command(["shuffle", "cshuffle"]) & filters.group & ~BANNED_USERS
 )
 @AdminRightsCheck
+@serialized
 async def admins(Client, message: Message, _, chat_id):
     check = db.get(chat_id)
     if not check:
@@ -10,8 +10,8 @@ from EsproMusic.utils.database import (
     get_active_chats,
     get_authuser_names,
     get_client,
-    get_served_chats,
-    get_served_users,
+    iter_served_chat_ids,
+    iter_served_user_ids,
 )
 from EsproMusic.utils.decorators.language import language
 from EsproMusic.utils.formatters import alpha_to_int
@@ -51,11 +51,7 @@ async def braodcast_message(client, message, _):
     if "-nobot" not in message.text:
         sent = 0
         pin = 0
-        chats = []
-        schats = await get_served_chats()
-        for chat in schats:
-            chats.append(int(chat["chat_id"]))
-        for i in chats:
+        async for i in iter_served_chat_ids():
             try:
                 m = (
                     await app.forward_messages(i, y, x)
@@ -90,11 +86,7 @@ async def braodcast_message(client, message, _):
 
     if "-user" in message.text:
         susr = 0
-        served_users = []
-        susers = await get_served_users()
-        for user in susers:
-            served_users.append(int(user["user_id"]))
-        for i in served_users:
+        async for i in iter_served_user_ids():
             try:
                 m = (
                     await app.forward_messages(i, y, x)
@@ -0,0 +1,24 @@
+from pyrogram import filters
+from pyrogram.types import Message
+
+from EsproMusic import app
+from EsproMusic.misc import SUDOERS
+from EsproMusic.utils.database import explain_queries
+
+
+@app.on_message(filters.command("explain") & SUDOERS)
+async def explain_plans(_, message: Message):
+    mystic = await message.reply_text("» ᴄʜᴇᴄᴋɪɴɢ ǫᴜᴇʀʏ ᴘʟᴀɴs...")
+    results = await explain_queries()
+    scans = [result for result in results if result["collscan"]]
+    lines = [
+        f"{'⚠️' if result['collscan'] else '✅'} <code>{result['helper']}</code> "
+        f"({result['collection']}): {' → '.join(result['stages'])}"
+        for result in results
+    ]
+    header = (
+        f"» {len(scans)} ǫᴜᴇʀɪᴇs ᴅᴏ ᴀ ᴄᴏʟʟᴇᴄᴛɪᴏɴ sᴄᴀɴ."
+        if scans
+        else "» ᴀʟʟ ǫᴜᴇʀɪᴇs ᴀʀᴇ ɪɴᴅᴇxᴇᴅ."
+    )
+    await mystic.edit_text(header + "\n\n" + "\n".join(lines))
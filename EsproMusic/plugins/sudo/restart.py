@@ -18,6 +18,7 @@ from EsproMusic.utils.database import (
     remove_active_video_chat,
 )
 from EsproMusic.utils.decorators.language import language
+from EsproMusic.utils.mediacache import media_cache
 from EsproMusic.utils.pastebin import RitikBin
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -126,7 +127,15 @@ async def restart_(_, message):
             pass
 
     try:
-        shutil.rmtree("downloads")
+        for item in os.listdir("downloads"):
+            path = os.path.join("downloads", item)
+            # Keep the media cache so popular songs don't need re-downloading
+            if os.path.abspath(path) == media_cache.root:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
         shutil.rmtree("raw_files")
         shutil.rmtree("cache")
     except:
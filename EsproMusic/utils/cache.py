@@ -0,0 +1,109 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+_MISSING = object()
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one in-flight task."""
+
+    def __init__(self):
+        self._calls = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+
+            def _done(t, key=key):
+                if self._calls.get(key) is t:
+                    self._calls.pop(key, None)
+
+            task.add_done_callback(_done)
+        # Shield so a cancelled waiter doesn't cancel the work shared with others.
+        return await asyncio.shield(task)
+
+
+class TTLCache:
+    """Bounded in-memory LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.peek(key, _MISSING) is not _MISSING
+
+    def peek(self, key: Hashable, default=None):
+        """Return a live entry without touching LRU order or counters."""
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            return default
+        return item[1]
+
+    def get(self, key: Hashable, default=None):
+        item = self._data.get(key)
+        if item is not None:
+            if item[0] >= time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            del self._data[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value, ttl: float = None):
+        self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        self._data.clear()
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        """Return the cached value, or run `loader` once for all concurrent callers."""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        async def _load():
+            result = await loader()
+            self.set(key, result)
+            return result
+
+        return await self._flight.do(key, _load)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "inflight": len(self._flight),
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
@@ -1,8 +1,15 @@
+import asyncio
+import copy
 import random
 from typing import Dict, List, Union
 
-from EsproMusic import userbot
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+
+from EsproMusic import LOGGER, userbot
 from EsproMusic.core.mongo import mongodb
+from EsproMusic.utils.cache import TTLCache
+from config import FLAGS_REFRESH_INTERVAL
 
 authdb = mongodb.adminauth
 authuserdb = mongodb.authuser
@@ -18,6 +25,8 @@ langdb = mongodb.language
 onoffdb = mongodb.onoffper
 playmodedb = mongodb.playmode
 playtypedb = mongodb.playtypedb
+settingsdb = mongodb.chatsettings
+migrationsdb = mongodb.migrations
 skipdb = mongodb.skipmode
 sudoersdb = mongodb.sudoers
 usersdb = mongodb.tgusersdb
@@ -27,16 +36,170 @@ active = []
 activevideo = []
 assistantdict = {}
 autoend = {}
-count = {}
-channelconnect = {}
-langm = {}
 loop = {}
-maintenance = []
-nonadmin = {}
 pause = {}
-playmode = {}
-playtype = {}
-skipmode = {}
+
+# Global switches, read from memory. load_flags() fills them at startup and
+# refresh_flags() reloads them so other replicas' changes are picked up.
+AUTOEND_KEY = 1234
+flags = {"autoend": False, "on_off": set()}
+flags_loaded = []
+
+# One settings document per chat, replacing the per-setting collections below
+CHAT_SETTINGS_CACHE_SIZE = 10000
+CHAT_SETTINGS_TTL = 3600
+CHAT_DEFAULTS = {
+    "lang": "en",
+    "playmode": "Direct",
+    "playtype": "Everyone",
+    "skipmode": True,
+    "upvotes": 5,
+    "cmode": None,
+    "assistant": None,
+    "nonadmin": False,
+    "quality": "high",
+    "authusers": {},
+}
+chat_settings = TTLCache(CHAT_SETTINGS_CACHE_SIZE, CHAT_SETTINGS_TTL)
+
+
+# Lookup key of every collection the helpers below query
+INDEXES = [
+    (autoenddb, "chat_id"),
+    (blacklist_chatdb, "chat_id"),
+    (blockeddb, "user_id"),
+    (chatsdb, "chat_id"),
+    (gbansdb, "user_id"),
+    (migrationsdb, "name"),
+    (onoffdb, "on_off"),
+    (settingsdb, "chat_id"),
+    (sudoersdb, "sudo"),
+    (usersdb, "user_id"),
+]
+
+# (helper, collection, filter) for every hot query, checked by explain_queries()
+QUERY_PLANS = [
+    ("load_flags", autoenddb, {"chat_id": AUTOEND_KEY}),
+    ("blacklisted_chats", blacklist_chatdb, {"chat_id": {"$lt": 0}}),
+    ("is_banned_user", blockeddb, {"user_id": 1}),
+    ("get_banned_users", blockeddb, {"user_id": {"$gt": 0}}),
+    ("is_served_chat", chatsdb, {"chat_id": -1}),
+    ("get_served_chats", chatsdb, {"chat_id": {"$lt": 0}}),
+    ("is_gbanned_user", gbansdb, {"user_id": 1}),
+    ("get_gbanned", gbansdb, {"user_id": {"$gt": 0}}),
+    ("migrate_chat_settings", migrationsdb, {"name": "chat_settings"}),
+    ("get_chat_settings", settingsdb, {"chat_id": -1}),
+    ("get_sudoers", sudoersdb, {"sudo": "sudo"}),
+    ("is_served_user", usersdb, {"user_id": 1}),
+    ("get_served_users", usersdb, {"user_id": {"$gt": 0}}),
+]
+
+
+async def ensure_indexes():
+    """Create a unique index on each collection's lookup key (idempotent)."""
+    for collection, key in INDEXES:
+        try:
+            await collection.create_index(key, unique=True)
+        except OperationFailure as e:
+            # Usually duplicate documents from older versions; still index the key
+            LOGGER(__name__).warning(
+                f"Unique index on {collection.name}.{key} failed, using a plain one: {e}"
+            )
+            try:
+                await collection.create_index(key)
+            except OperationFailure:
+                pass
+
+
+def _plan_stages(plan: dict) -> List[str]:
+    stages = [plan.get("stage", "?")]
+    for child in ("inputStage", "queryPlan"):
+        if child in plan:
+            stages += _plan_stages(plan[child])
+    for child in plan.get("inputStages", []):
+        stages += _plan_stages(child)
+    return stages
+
+
+async def explain_queries() -> List[dict]:
+    """Winning plan of each helper's query; `collscan` marks unindexed ones."""
+    results = []
+    for helper, collection, query in QUERY_PLANS:
+        try:
+            plan = await collection.find(query).explain()
+            stages = _plan_stages(plan["queryPlanner"]["winningPlan"])
+        except Exception as e:
+            stages = [f"error: {e}"]
+        results.append(
+            {
+                "helper": helper,
+                "collection": collection.name,
+                "stages": stages,
+                "collscan": "COLLSCAN" in stages,
+            }
+        )
+    return results
+
+
+async def get_chat_settings(chat_id: int) -> dict:
+    """All settings of a chat, loaded in one query and cached."""
+
+    async def load():
+        settings = copy.deepcopy(CHAT_DEFAULTS)
+        document = await settingsdb.find_one({"chat_id": chat_id})
+        if document:
+            document.pop("_id", None)
+            settings.update(document)
+        settings["chat_id"] = chat_id
+        return settings
+
+    return await chat_settings.get_or_load(chat_id, load)
+
+
+def peek_chat_setting(chat_id: int, key: str):
+    """Cached setting without a database round trip; the default if not loaded."""
+    settings = chat_settings.peek(chat_id)
+    return (settings or CHAT_DEFAULTS)[key]
+
+
+async def set_chat_setting(chat_id: int, **values):
+    """Write-through update of one or more settings of a chat."""
+    settings = await get_chat_settings(chat_id)
+    settings.update(values)
+    await settingsdb.update_one({"chat_id": chat_id}, {"$set": values}, upsert=True)
+
+
+async def migrate_chat_settings():
+    """Fold the old per-setting collections into chatsettings, once."""
+    if await migrationsdb.find_one({"name": "chat_settings"}):
+        return
+    sources = [
+        (langdb, lambda d: {"lang": d["lang"]}),
+        (playmodedb, lambda d: {"playmode": d["mode"]}),
+        (playtypedb, lambda d: {"playtype": d["mode"]}),
+        (skipdb, lambda d: {"skipmode": False}),
+        (countdb, lambda d: {"upvotes": d["mode"]}),
+        (channeldb, lambda d: {"cmode": d["mode"]}),
+        (assdb, lambda d: {"assistant": d["assistant"]}),
+        (authdb, lambda d: {"nonadmin": True}),
+        (authuserdb, lambda d: {"authusers": d["notes"]}),
+    ]
+    migrated = 0
+    for collection, convert in sources:
+        operations = []
+        async for document in collection.find({"chat_id": {"$exists": True}}):
+            try:
+                values = convert(document)
+            except KeyError:
+                continue
+            operations.append(
+                UpdateOne({"chat_id": document["chat_id"]}, {"$set": values}, upsert=True)
+            )
+        if operations:
+            await settingsdb.bulk_write(operations, ordered=False)
+            migrated += len(operations)
+    await migrationsdb.insert_one({"name": "chat_settings", "documents": migrated})
+    LOGGER(__name__).info(f"Migrated {migrated} chat settings into chatsettings")
 
 
 async def get_assistant_number(chat_id: int) -> str:
@@ -45,39 +208,52 @@ async def get_assistant_number(chat_id: int) -> str:
 
 
 async def get_client(assistant: int):
-    if int(assistant) == 1:
-        return userbot.one
-    elif int(assistant) == 2:
-        return userbot.two
-    elif int(assistant) == 3:
-        return userbot.three
-    elif int(assistant) == 4:
-        return userbot.four
-    elif int(assistant) == 5:
-        return userbot.five
+    return userbot.get(assistant)
+
+
+# Placement score: one point per audio call, more for video calls, plus ping
+VIDEO_CALL_WEIGHT = 2
+LATENCY_WEIGHT = 1 / 100  # one extra "call" per 100ms of ping
+
+
+def get_assistant_loads() -> Dict[int, dict]:
+    """Active calls, ping and placement score of every running assistant."""
+    from EsproMusic.core.userbot import assistant_latency, assistants
+
+    loads = {
+        number: {"calls": 0, "video": 0, "latency": assistant_latency.get(number, 0)}
+        for number in assistants
+    }
+    for chat_id in active:
+        load = loads.get(assistantdict.get(chat_id))
+        if load is None:
+            continue
+        load["calls"] += 1
+        if chat_id in activevideo:
+            load["video"] += 1
+    for load in loads.values():
+        load["score"] = (
+            load["calls"]
+            + (VIDEO_CALL_WEIGHT - 1) * load["video"]
+            + LATENCY_WEIGHT * load["latency"]
+        )
+    return loads
+
+
+def least_loaded_assistant(exclude=()) -> int:
+    loads = get_assistant_loads()
+    candidates = [number for number in loads if number not in exclude] or list(loads)
+    # random tie-break so idle assistants share new chats evenly
+    return min(candidates, key=lambda number: (loads[number]["score"], random.random()))
 
 
 async def set_assistant_new(chat_id, number):
-    number = int(number)
-    await assdb.update_one(
-        {"chat_id": chat_id},
-        {"$set": {"assistant": number}},
-        upsert=True,
-    )
+    await set_chat_setting(chat_id, assistant=int(number))
 
 
 async def set_assistant(chat_id):
-    from EsproMusic.core.userbot import assistants
-
-    ran_assistant = random.choice(assistants)
-    assistantdict[chat_id] = ran_assistant
-    await assdb.update_one(
-        {"chat_id": chat_id},
-        {"$set": {"assistant": ran_assistant}},
-        upsert=True,
-    )
-    userbot = await get_client(ran_assistant)
-    return userbot
+    number = await set_calls_assistant(chat_id)
+    return await get_client(number)
 
 
 async def get_assistant(chat_id: int) -> str:
@@ -85,19 +261,14 @@ async def get_assistant(chat_id: int) -> str:
 
     assistant = assistantdict.get(chat_id)
     if not assistant:
-        dbassistant = await assdb.find_one({"chat_id": chat_id})
-        if not dbassistant:
-            userbot = await set_assistant(chat_id)
+        got_assis = (await get_chat_settings(chat_id))["assistant"]
+        if got_assis in assistants:
+            assistantdict[chat_id] = got_assis
+            userbot = await get_client(got_assis)
             return userbot
         else:
-            got_assis = dbassistant["assistant"]
-            if got_assis in assistants:
-                assistantdict[chat_id] = got_assis
-                userbot = await get_client(got_assis)
-                return userbot
-            else:
-                userbot = await set_assistant(chat_id)
-                return userbot
+            userbot = await set_assistant(chat_id)
+            return userbot
     else:
         if assistant in assistants:
             userbot = await get_client(assistant)
@@ -108,16 +279,10 @@ async def get_assistant(chat_id: int) -> str:
 
 
 async def set_calls_assistant(chat_id):
-    from EsproMusic.core.userbot import assistants
-
-    ran_assistant = random.choice(assistants)
-    assistantdict[chat_id] = ran_assistant
-    await assdb.update_one(
-        {"chat_id": chat_id},
-        {"$set": {"assistant": ran_assistant}},
-        upsert=True,
-    )
-    return ran_assistant
+    number = least_loaded_assistant()
+    assistantdict[chat_id] = number
+    await set_chat_setting(chat_id, assistant=number)
+    return number
 
 
 async def group_assistant(self, chat_id: int) -> int:
@@ -125,93 +290,81 @@ async def group_assistant(self, chat_id: int) -> int:
 
     assistant = assistantdict.get(chat_id)
     if not assistant:
-        dbassistant = await assdb.find_one({"chat_id": chat_id})
-        if not dbassistant:
-            assis = await set_calls_assistant(chat_id)
+        assis = (await get_chat_settings(chat_id))["assistant"]
+        if assis in assistants:
+            assistantdict[chat_id] = assis
         else:
-            assis = dbassistant["assistant"]
-            if assis in assistants:
-                assistantdict[chat_id] = assis
-                assis = assis
-            else:
-                assis = await set_calls_assistant(chat_id)
+            assis = await set_calls_assistant(chat_id)
     else:
         if assistant in assistants:
             assis = assistant
         else:
             assis = await set_calls_assistant(chat_id)
-    if int(assis) == 1:
-        return self.one
-    elif int(assis) == 2:
-        return self.two
-    elif int(assis) == 3:
-        return self.three
-    elif int(assis) == 4:
-        return self.four
-    elif int(assis) == 5:
-        return self.five
+    return self.calls[int(assis)]
 
 
 async def is_skipmode(chat_id: int) -> bool:
-    mode = skipmode.get(chat_id)
-    if not mode:
-        user = await skipdb.find_one({"chat_id": chat_id})
-        if not user:
-            skipmode[chat_id] = True
-            return True
-        skipmode[chat_id] = False
-        return False
-    return mode
+    return (await get_chat_settings(chat_id))["skipmode"]
 
 
 async def skip_on(chat_id: int):
-    skipmode[chat_id] = True
-    user = await skipdb.find_one({"chat_id": chat_id})
-    if user:
-        return await skipdb.delete_one({"chat_id": chat_id})
+    await set_chat_setting(chat_id, skipmode=True)
 
 
 async def skip_off(chat_id: int):
-    skipmode[chat_id] = False
-    user = await skipdb.find_one({"chat_id": chat_id})
-    if not user:
-        return await skipdb.insert_one({"chat_id": chat_id})
+    await set_chat_setting(chat_id, skipmode=False)
 
 
 async def get_upvote_count(chat_id: int) -> int:
-    mode = count.get(chat_id)
-    if not mode:
-        mode = await countdb.find_one({"chat_id": chat_id})
-        if not mode:
-            return 5
-        count[chat_id] = mode["mode"]
-        return mode["mode"]
-    return mode
+    return (await get_chat_settings(chat_id))["upvotes"]
 
 
 async def set_upvotes(chat_id: int, mode: int):
-    count[chat_id] = mode
-    await countdb.update_one(
-        {"chat_id": chat_id}, {"$set": {"mode": mode}}, upsert=True
-    )
+    await set_chat_setting(chat_id, upvotes=mode)
+
+
+async def load_flags():
+    enabled = await autoenddb.find_one({"chat_id": AUTOEND_KEY})
+    on_off = set()
+    async for doc in onoffdb.find({}, {"on_off": 1}):
+        on_off.add(doc.get("on_off"))
+    flags["autoend"] = bool(enabled)
+    flags["on_off"] = on_off
+    if not flags_loaded:
+        flags_loaded.append(True)
+
+
+async def refresh_flags():
+    if FLAGS_REFRESH_INTERVAL <= 0:
+        return
+    while True:
+        await asyncio.sleep(FLAGS_REFRESH_INTERVAL)
+        try:
+            await load_flags()
+        except Exception as e:
+            LOGGER(__name__).warning(f"Reloading flags failed: {e}")
+
+
+async def _flags() -> dict:
+    if not flags_loaded:
+        await load_flags()
+    return flags
 
 
 async def is_autoend() -> bool:
-    chat_id = 1234
-    user = await autoenddb.find_one({"chat_id": chat_id})
-    if not user:
-        return False
-    return True
+    return (await _flags())["autoend"]
 
 
 async def autoend_on():
-    chat_id = 1234
-    await autoenddb.insert_one({"chat_id": chat_id})
+    flags["autoend"] = True
+    await autoenddb.update_one(
+        {"chat_id": AUTOEND_KEY}, {"$setOnInsert": {"chat_id": AUTOEND_KEY}}, upsert=True
+    )
 
 
 async def autoend_off():
-    chat_id = 1234
-    await autoenddb.delete_one({"chat_id": chat_id})
+    flags["autoend"] = False
+    await autoenddb.delete_one({"chat_id": AUTOEND_KEY})
 
 
 async def get_loop(chat_id: int) -> int:
@@ -226,76 +379,43 @@ async def set_loop(chat_id: int, mode: int):
 
 
 async def get_cmode(chat_id: int) -> int:
-    mode = channelconnect.get(chat_id)
-    if not mode:
-        mode = await channeldb.find_one({"chat_id": chat_id})
-        if not mode:
-            return None
-        channelconnect[chat_id] = mode["mode"]
-        return mode["mode"]
-    return mode
+    return (await get_chat_settings(chat_id))["cmode"]
 
 
 async def set_cmode(chat_id: int, mode: int):
-    channelconnect[chat_id] = mode
-    await channeldb.update_one(
-        {"chat_id": chat_id}, {"$set": {"mode": mode}}, upsert=True
-    )
+    await set_chat_setting(chat_id, cmode=mode)
 
 
 async def get_playtype(chat_id: int) -> str:
-    mode = playtype.get(chat_id)
-    if not mode:
-        mode = await playtypedb.find_one({"chat_id": chat_id})
-        if not mode:
-            playtype[chat_id] = "Everyone"
-            return "Everyone"
-        playtype[chat_id] = mode["mode"]
-        return mode["mode"]
-    return mode
+    return (await get_chat_settings(chat_id))["playtype"]
 
 
 async def set_playtype(chat_id: int, mode: str):
-    playtype[chat_id] = mode
-    await playtypedb.update_one(
-        {"chat_id": chat_id}, {"$set": {"mode": mode}}, upsert=True
-    )
+    await set_chat_setting(chat_id, playtype=mode)
 
 
 async def get_playmode(chat_id: int) -> str:
-    mode = playmode.get(chat_id)
-    if not mode:
-        mode = await playmodedb.find_one({"chat_id": chat_id})
-        if not mode:
-            playmode[chat_id] = "Direct"
-            return "Direct"
-        playmode[chat_id] = mode["mode"]
-        return mode["mode"]
-    return mode
+    return (await get_chat_settings(chat_id))["playmode"]
 
 
 async def set_playmode(chat_id: int, mode: str):
-    playmode[chat_id] = mode
-    await playmodedb.update_one(
-        {"chat_id": chat_id}, {"$set": {"mode": mode}}, upsert=True
-    )
+    await set_chat_setting(chat_id, playmode=mode)
+
+
+async def get_quality(chat_id: int) -> str:
+    return (await get_chat_settings(chat_id))["quality"]
+
+
+async def set_quality(chat_id: int, mode: str):
+    await set_chat_setting(chat_id, quality=mode)
 
 
 async def get_lang(chat_id: int) -> str:
-    mode = langm.get(chat_id)
-    if not mode:
-        lang = await langdb.find_one({"chat_id": chat_id})
-        if not lang:
-            langm[chat_id] = "en"
-            return "en"
-        langm[chat_id] = lang["lang"]
-        return lang["lang"]
-    return mode
+    return (await get_chat_settings(chat_id))["lang"]
 
 
 async def set_lang(chat_id: int, lang: str):
-    langm[chat_id] = lang
-    await langdb.update_one({"chat_id": chat_id}, {"$set": {"lang": lang}}, upsert=True)
+    await set_chat_setting(chat_id, lang=lang)
 
 
 async def is_Music_playing(chat_id: int) -> bool:
@@ -356,101 +476,111 @@ async def remove_active_video_chat(chat_id: int):
 
 
 async def check_nonadmin_chat(chat_id: int) -> bool:
-    user = await authdb.find_one({"chat_id": chat_id})
-    if not user:
-        return False
-    return True
+    return (await get_chat_settings(chat_id))["nonadmin"]
 
 
 async def is_nonadmin_chat(chat_id: int) -> bool:
-    mode = nonadmin.get(chat_id)
-    if not mode:
-        user = await authdb.find_one({"chat_id": chat_id})
-        if not user:
-            nonadmin[chat_id] = False
-            return False
-        nonadmin[chat_id] = True
-        return True
-    return mode
+    return (await get_chat_settings(chat_id))["nonadmin"]
 
 
 async def add_nonadmin_chat(chat_id: int):
-    nonadmin[chat_id] = True
-    is_admin = await check_nonadmin_chat(chat_id)
-    if is_admin:
-        return
-    return await authdb.insert_one({"chat_id": chat_id})
+    await set_chat_setting(chat_id, nonadmin=True)
 
 
 async def remove_nonadmin_chat(chat_id: int):
-    nonadmin[chat_id] = False
-    is_admin = await check_nonadmin_chat(chat_id)
-    if not is_admin:
-        return
-    return await authdb.delete_one({"chat_id": chat_id})
+    await set_chat_setting(chat_id, nonadmin=False)
 
 
 async def is_on_off(on_off: int) -> bool:
-    onoff = await onoffdb.find_one({"on_off": on_off})
-    if not onoff:
-        return False
-    return True
+    return on_off in (await _flags())["on_off"]
 
 
 async def add_on(on_off: int):
-    is_on = await is_on_off(on_off)
-    if is_on:
+    if await is_on_off(on_off):
         return
-    return await onoffdb.insert_one({"on_off": on_off})
+    flags["on_off"].add(on_off)
+    return await onoffdb.update_one(
+        {"on_off": on_off}, {"$setOnInsert": {"on_off": on_off}}, upsert=True
+    )
 
 
 async def add_off(on_off: int):
-    is_off = await is_on_off(on_off)
-    if not is_off:
+    if not await is_on_off(on_off):
         return
+    flags["on_off"].discard(on_off)
     return await onoffdb.delete_one({"on_off": on_off})
 
 
 async def is_maintenance():
-    if not maintenance:
-        get = await onoffdb.find_one({"on_off": 1})
-        if not get:
-            maintenance.clear()
-            maintenance.append(2)
-            return True
-        else:
-            maintenance.clear()
-            maintenance.append(1)
-            return False
-    else:
-        if 1 in maintenance:
-            return False
-        else:
-            return True
+    # on_off 1 is stored while maintenance mode is active
+    return not await is_on_off(1)
 
 
 async def maintenance_off():
-    maintenance.clear()
-    maintenance.append(2)
-    is_off = await is_on_off(1)
-    if not is_off:
-        return
-    return await onoffdb.delete_one({"on_off": 1})
+    return await add_off(1)
 
 
 async def maintenance_on():
-    maintenance.clear()
-    maintenance.append(1)
-    is_on = await is_on_off(1)
-    if is_on:
+    return await add_on(1)
+
+
+# Served users/chats are recorded write-behind: recently seen IDs are skipped,
+# new ones are upserted in unordered batches every SERVED_FLUSH_INTERVAL.
+SERVED_FLUSH_INTERVAL = 5
+SERVED_BATCH_SIZE = 1000
+SERVED_SEEN_SIZE = 50000  # per kind; older IDs fall out and are checked again
+SERVED_SEEN_TTL = 24 * 3600
+served_seen = {
+    "user_id": TTLCache(SERVED_SEEN_SIZE, SERVED_SEEN_TTL),
+    "chat_id": TTLCache(SERVED_SEEN_SIZE, SERVED_SEEN_TTL),
+}
+served_pending = {"user_id": set(), "chat_id": set()}
+served_flusher = None
+
+
+def _queue_served(key: str, value: int):
+    global served_flusher
+    if served_seen[key].get(value):
         return
-    return await onoffdb.insert_one({"on_off": 1})
+    served_seen[key].set(value, True)
+    served_pending[key].add(value)
+    if served_flusher is None or served_flusher.done():
+        served_flusher = asyncio.create_task(_flush_served_loop())
+
+
+async def _flush_served_loop():
+    while any(served_pending.values()):
+        await asyncio.sleep(SERVED_FLUSH_INTERVAL)
+        await flush_served()
+
+
+async def flush_served():
+    """Write every pending served user/chat to Mongo."""
+    for key, collection in (("user_id", usersdb), ("chat_id", chatsdb)):
+        pending = list(served_pending[key])
+        served_pending[key].clear()
+        for start in range(0, len(pending), SERVED_BATCH_SIZE):
+            batch = pending[start : start + SERVED_BATCH_SIZE]
+            try:
+                await collection.bulk_write(
+                    [
+                        UpdateOne({key: value}, {"$setOnInsert": {key: value}}, upsert=True)
+                        for value in batch
+                    ],
+                    ordered=False,
+                )
+            except Exception as e:
+                LOGGER(__name__).warning(f"Saving {len(batch)} served {key}s failed: {e}")
+                served_pending[key].update(batch)
 
 
 async def is_served_user(user_id: int) -> bool:
+    if served_seen["user_id"].get(user_id):
+        return True
     user = await usersdb.find_one({"user_id": user_id})
     if not user:
         return False
+    served_seen["user_id"].set(user_id, True)
     return True
 
 
@@ -462,10 +592,57 @@ async def get_served_users() -> list:
 
 
 async def add_served_user(user_id: int):
-    is_served = await is_served_user(user_id)
-    if is_served:
-        return
-    return await usersdb.insert_one({"user_id": user_id})
+    _queue_served("user_id", user_id)
+
+
+async def _iter_served_ids(collection, key: str, query: dict):
+    # Keyset pagination on _id: each page is its own short query, so slow
+    # consumers (broadcast, gban) never hold a server cursor open.
+    last = None
+    while True:
+        page_query = dict(query)
+        if last is not None:
+            page_query["_id"] = {"$gt": last}
+        page = await (
+            collection.find(page_query, {key: 1})
+            .sort("_id", 1)
+            .limit(SERVED_BATCH_SIZE)
+            .to_list(length=SERVED_BATCH_SIZE)
+        )
+        for doc in page:
+            yield int(doc[key])
+        if len(page) < SERVED_BATCH_SIZE:
+            return
+        last = page[-1]["_id"]
+
+
+async def iter_served_user_ids():
+    async for user_id in _iter_served_ids(usersdb, "user_id", {"user_id": {"$gt": 0}}):
+        yield user_id
+
+
+async def iter_served_chat_ids():
+    async for chat_id in _iter_served_ids(chatsdb, "chat_id", {"chat_id": {"$lt": 0}}):
+        yield chat_id
+
+
+async def _served_count(collection, key: str, query: dict, pending: list) -> int:
+    # IDs still waiting for the next flush count too, unless already stored
+    count = await collection.count_documents(query)
+    if pending:
+        stored = await collection.count_documents({key: {"$in": pending}})
+        count += len(pending) - stored
+    return count
+
+
+async def served_users_count() -> int:
+    pending = [user_id for user_id in served_pending["user_id"] if user_id > 0]
+    return await _served_count(usersdb, "user_id", {"user_id": {"$gt": 0}}, pending)
+
+
+async def served_chats_count() -> int:
+    pending = [chat_id for chat_id in served_pending["chat_id"] if chat_id < 0]
+    return await _served_count(chatsdb, "chat_id", {"chat_id": {"$lt": 0}}, pending)
 
 
 async def get_served_chats() -> list:
@@ -476,17 +653,17 @@ async def get_served_chats() -> list:
 
 
 async def is_served_chat(chat_id: int) -> bool:
+    if served_seen["chat_id"].get(chat_id):
+        return True
     chat = await chatsdb.find_one({"chat_id": chat_id})
     if not chat:
         return False
+    served_seen["chat_id"].set(chat_id, True)
     return True
 
 
 async def add_served_chat(chat_id: int):
-    is_served = await is_served_chat(chat_id)
-    if is_served:
-        return
-    return await chatsdb.insert_one({"chat_id": chat_id})
+    _queue_served("chat_id", chat_id)
 
 
 async def blacklisted_chats() -> list:
@@ -511,10 +688,7 @@ async def whitelist_chat(chat_id: int) -> bool:
 
 
 async def _get_authusers(chat_id: int) -> Dict[str, int]:
-    _notes = await authuserdb.find_one({"chat_id": chat_id})
-    if not _notes:
-        return {}
-    return _notes["notes"]
+    return (await get_chat_settings(chat_id))["authusers"]
 
 
 async def get_authuser_names(chat_id: int) -> List[str]:
@@ -534,25 +708,16 @@ async def get_authuser(chat_id: int, name: str) -> Union[bool, dict]:
 
 
 async def save_authuser(chat_id: int, name: str, note: dict):
-    name = name
-    _notes = await _get_authusers(chat_id)
+    _notes = dict(await _get_authusers(chat_id))
     _notes[name] = note
-
-    await authuserdb.update_one(
-        {"chat_id": chat_id}, {"$set": {"notes": _notes}}, upsert=True
-    )
+    await set_chat_setting(chat_id, authusers=_notes)
 
 
 async def delete_authuser(chat_id: int, name: str) -> bool:
-    notesd = await _get_authusers(chat_id)
-    name = name
+    notesd = dict(await _get_authusers(chat_id))
     if name in notesd:
         del notesd[name]
-        await authuserdb.update_one(
-            {"chat_id": chat_id},
-            {"$set": {"notes": notesd}},
-            upsert=True,
-        )
+        await set_chat_setting(chat_id, authusers=notesd)
         return True
     return False
 
@@ -620,9 +785,7 @@ async def get_banned_users() -> list:
 
 
 async def get_banned_count() -> int:
-    users = blockeddb.find({"user_id": {"$gt": 0}})
-    users = await users.to_list(length=100000)
-    return len(users)
+    return await blockeddb.count_documents({"user_id": {"$gt": 0}})
 
 
 async def is_banned_user(user_id: int) -> bool:
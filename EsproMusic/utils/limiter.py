@@ -0,0 +1,111 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Hashable, Optional
+
+# Lower numbers are admitted first.
+PRIORITY_PLAYING = 0
+PRIORITY_BACKGROUND = 1
+
+
+class PriorityLimiter:
+    """
+    Caps how many jobs run at once and admits waiting jobs by priority.
+
+    Waiters may be tagged with a key so that a queued background job can be
+    promoted when something on the playback path starts depending on it.
+    `reserved` extra slots are only handed to PRIORITY_PLAYING jobs, so long
+    background jobs can never hold up playback entirely.
+    """
+
+    def __init__(self, limit: int, reserved: int = 0):
+        self.limit = max(1, int(limit))
+        self.reserved = max(0, int(reserved))
+        self._active = 0
+        self._waiters = []
+        self._keys = {}
+        self._seq = itertools.count()
+        self.admitted = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for entry in self._waiters if not entry[2].done())
+
+    def _capacity(self, priority: int) -> int:
+        return self.limit + (self.reserved if priority <= PRIORITY_PLAYING else 0)
+
+    async def acquire(self, priority: int = PRIORITY_PLAYING, key: Optional[Hashable] = None):
+        start = time.monotonic()
+        ahead = any(p <= priority and not f.done() for p, _, f in self._waiters)
+        if self._active < self._capacity(priority) and not ahead:
+            self._active += 1
+            self._admitted(start)
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        if key is not None:
+            self._keys[key] = future
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            if key is not None and self._keys.get(key) is future:
+                self._keys.pop(key, None)
+        self._admitted(start)
+
+    def release(self):
+        self._active -= 1
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            # The most urgent waiter is first; if it doesn't fit, nothing else does
+            if self._active >= self._capacity(priority):
+                break
+            heapq.heappop(self._waiters)
+            self._active += 1
+            future.set_result(None)
+
+    def promote(self, key: Hashable, priority: int = PRIORITY_PLAYING):
+        """Re-queue a waiting job under a more urgent priority."""
+        future = self._keys.get(key)
+        if future is not None and not future.done():
+            # The stale heap entry is skipped once the future has been resolved.
+            heapq.heappush(self._waiters, (priority, next(self._seq), future))
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_PLAYING, key: Optional[Hashable] = None):
+        await self.acquire(priority, key)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _admitted(self, start: float):
+        waited = time.monotonic() - start
+        self.admitted += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "reserved": self.reserved,
+            "active": self._active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "avg_wait": round(self.total_wait / self.admitted, 3) if self.admitted else 0.0,
+            "max_wait": round(self.max_wait, 3),
+        }
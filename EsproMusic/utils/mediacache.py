@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+from typing import Iterable, Optional
+
+from config import (
+    MEDIA_CACHE_DIR,
+    MEDIA_CACHE_POLICY,
+    MEDIA_CACHE_SIZE,
+    PLAYBACK_CACHE_DIR,
+    PLAYBACK_CACHE_SIZE,
+)
+
+from ..logging import LOGGER
+
+INDEX_FILE = "index.json"
+
+
+def _files_in_use() -> set:
+    """Paths referenced by any queue entry; these are never evicted."""
+    from EsproMusic import misc
+
+    paths = set()
+    for queue in getattr(misc, "db", {}).values():
+        for entry in queue or []:
+            for key in ("file", "speed_path", "cache_path"):
+                value = entry.get(key)
+                if value:
+                    paths.add(os.path.abspath(str(value)))
+    return paths
+
+
+class MediaCache:
+    """
+    Content-addressed on-disk cache for downloaded media.
+
+    Entries are keyed by a tuple such as (video_id, "audio", max_res) and
+    written atomically: data goes to a temp file that is renamed into place
+    on commit. The index is persisted as JSON so the cache survives restarts,
+    and the total size is kept under `budget` bytes by evicting the least
+    recently used ("lru") or least played ("lfu") entries.
+    """
+
+    def __init__(self, root: str, budget: int, policy: str = "lru"):
+        self.root = os.path.abspath(root)
+        self.budget = budget
+        self.policy = policy.lower()
+        self._index = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(self.root, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def name_for(key: Iterable) -> str:
+        raw = "|".join(str(part) for part in key)
+        return hashlib.sha1(raw.encode()).hexdigest()[:24]
+
+    def path_for(self, key: Iterable, ext: str) -> str:
+        return os.path.join(self.root, f"{self.name_for(key)}.{ext}")
+
+    def temp_path(self, key: Iterable, ext: str, suffix: str = ".part") -> str:
+        return os.path.join(
+            self.root, f"{self.name_for(key)}.{uuid.uuid4().hex[:8]}.{ext}{suffix}"
+        )
+
+    def owns(self, path: str) -> bool:
+        return bool(path) and os.path.abspath(str(path)).startswith(self.root + os.sep)
+
+    def has(self, key: Iterable) -> bool:
+        return self.name_for(key) in self._index
+
+    def get(self, key: Iterable) -> Optional[str]:
+        name = self.name_for(key)
+        entry = self._index.get(name)
+        if not entry or not os.path.isfile(entry["path"]):
+            if entry:
+                self._index.pop(name, None)
+            self.misses += 1
+            return None
+        entry["last"] = time.time()
+        entry["hits"] += 1
+        self.hits += 1
+        return entry["path"]
+
+    def commit(self, key: Iterable, temp: str, ext: str) -> str:
+        """Atomically move a finished temp file into the cache and index it."""
+        final = self.path_for(key, ext)
+        os.replace(temp, final)
+        self._index[self.name_for(key)] = {
+            "key": [str(part) for part in key],
+            "path": final,
+            "size": os.path.getsize(final),
+            "last": time.time(),
+            "hits": 0,
+        }
+        self.evict()
+        self.save()
+        return final
+
+    @staticmethod
+    def discard(path: Optional[str]):
+        if path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @property
+    def size(self) -> int:
+        return sum(entry["size"] for entry in self._index.values())
+
+    def evict(self):
+        total = self.size
+        if total <= self.budget:
+            return
+        if self.policy == "lfu":
+            order = sorted(self._index.items(), key=lambda i: (i[1]["hits"], i[1]["last"]))
+        else:
+            order = sorted(self._index.items(), key=lambda i: i[1]["last"])
+        in_use = _files_in_use()
+        for name, entry in order:
+            if total <= self.budget:
+                break
+            if entry["path"] in in_use:
+                continue
+            self.discard(entry["path"])
+            self._index.pop(name, None)
+            total -= entry["size"]
+            self.evictions += 1
+
+    def save(self):
+        path = os.path.join(self.root, INDEX_FILE)
+        temp = f"{path}.tmp"
+        try:
+            with open(temp, "w") as f:
+                json.dump(self._index, f)
+            os.replace(temp, path)
+        except OSError as e:
+            LOGGER(__name__).warning(f"Failed to save media cache index: {e}")
+
+    def _load(self):
+        path = os.path.join(self.root, INDEX_FILE)
+        try:
+            with open(path) as f:
+                self._index = json.load(f)
+        except (OSError, ValueError):
+            self._index = {}
+        self._index = {
+            name: entry
+            for name, entry in self._index.items()
+            if os.path.isfile(entry.get("path", ""))
+        }
+        known = {entry["path"] for entry in self._index.values()}
+        for file in os.listdir(self.root):
+            full = os.path.join(self.root, file)
+            if file.startswith(INDEX_FILE) or full in known:
+                continue
+            self.discard(full)
+        self.evict()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._index),
+            "size": self.size,
+            "budget": self.budget,
+            "policy": self.policy,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+media_cache = MediaCache(MEDIA_CACHE_DIR, MEDIA_CACHE_SIZE * 1024 * 1024, MEDIA_CACHE_POLICY)
+playback_cache = MediaCache(
+    PLAYBACK_CACHE_DIR, PLAYBACK_CACHE_SIZE * 1024 * 1024, MEDIA_CACHE_POLICY
+)
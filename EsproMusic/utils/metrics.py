@@ -0,0 +1,22 @@
+import asyncio
+
+from EsproMusic.logging import LOGGER
+
+METRICS_INTERVAL = 300  # seconds between performance summaries in the log
+
+# name -> function returning a dict of counters, logged every METRICS_INTERVAL
+reporters = {}
+
+
+def report(name: str, fn):
+    reporters[name] = fn
+
+
+async def log_metrics():
+    while True:
+        await asyncio.sleep(METRICS_INTERVAL)
+        for name, fn in list(reporters.items()):
+            try:
+                LOGGER(__name__).info(f"{name}: {fn()}")
+            except Exception as e:
+                LOGGER(__name__).warning(f"Collecting {name} metrics failed: {e}")
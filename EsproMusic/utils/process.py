@@ -0,0 +1,74 @@
+import asyncio
+import os
+import signal
+
+from config import FFMPEG_CONCURRENCY
+from EsproMusic.logging import LOGGER
+from EsproMusic.utils.formatters import check_duration
+from EsproMusic.utils.limiter import PRIORITY_BACKGROUND, PRIORITY_PLAYING, PriorityLimiter
+
+# Every ffmpeg/ffprobe the bot spawns outside PyTgCalls goes through this, so a
+# burst of transcodes cannot take the CPU the active calls' ffmpeg need. One
+# extra slot is kept for jobs a track start is waiting on.
+processes = PriorityLimiter(FFMPEG_CONCURRENCY, reserved=1)
+
+SLOW_WAIT = 5.0  # log jobs that queued longer than this
+
+
+async def _admit(priority: int, what: str):
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await processes.acquire(priority)
+    waited = loop.time() - start
+    if waited > SLOW_WAIT:
+        LOGGER(__name__).info(
+            f"{what} waited {waited:.1f}s for a process slot ({processes.queued} queued)"
+        )
+
+
+async def probe_duration(file_path, priority: int = PRIORITY_PLAYING) -> float:
+    """ffprobe duration of a file or URL, admitted through the process scheduler."""
+    await _admit(priority, "ffprobe")
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, check_duration, file_path
+        )
+    finally:
+        processes.release()
+
+
+async def run_ffmpeg(cmd: str, priority: int = PRIORITY_BACKGROUND) -> int:
+    """
+    Run an ffmpeg shell command once a slot is free; returns its exit code.
+    Cancelling the caller kills the command rather than leaving it running.
+    """
+    await _admit(priority, "ffmpeg")
+    try:
+        proc = await asyncio.create_subprocess_shell(
+            cmd=cmd,
+            stdin=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
+        )
+        try:
+            await proc.communicate()
+        except asyncio.CancelledError:
+            if proc.returncode is None:
+                # Own process group, so ffmpeg dies along with its shell
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+            raise
+        return proc.returncode
+    finally:
+        processes.release()
+
+
+def process_stats() -> dict:
+    """Running and queued jobs with their waits, plus the calls' own ffmpeg count."""
+    from EsproMusic.utils.database import active
+
+    stats = processes.stats()
+    stats["calls"] = len(active)
+    return stats
@@ -0,0 +1,78 @@
+import asyncio
+from collections import deque
+from functools import wraps
+
+from EsproMusic.logging import LOGGER
+
+actors = {}
+
+
+class ChatActor:
+    """
+    Mailbox for one chat: commands that change its queue or playback run one
+    at a time, in the order they were submitted.
+
+    The worker task only exists while there is work, so idle chats cost
+    nothing; a command that submits to its own chat runs inline instead of
+    waiting on itself.
+    """
+
+    def __init__(self, chat_id: int):
+        self.chat_id = chat_id
+        self.mailbox = deque()
+        self.task = None
+
+    def submit(self, fn, *args, **kwargs) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.mailbox.append((fn, args, kwargs, future))
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._drain())
+        return future
+
+    async def _drain(self):
+        while self.mailbox:
+            fn, args, kwargs, future = self.mailbox.popleft()
+            try:
+                result = await fn(*args, **kwargs)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                elif not future.cancelled():
+                    LOGGER(__name__).warning(f"Command in {self.chat_id} failed: {e}")
+                continue
+            if not future.done():
+                future.set_result(result)
+        if actors.get(self.chat_id) is self:
+            actors.pop(self.chat_id, None)
+
+
+async def run_in_chat(chat_id: int, fn, *args, **kwargs):
+    """Run `fn` through the chat's mailbox and wait for its result."""
+    actor = actors.get(chat_id)
+    if actor and actor.task is asyncio.current_task():
+        return await fn(*args, **kwargs)
+    if not actor:
+        actor = actors[chat_id] = ChatActor(chat_id)
+    # The command keeps running even if the caller stops waiting for it
+    return await asyncio.shield(actor.submit(fn, *args, **kwargs))
+
+
+def serialized(handler):
+    """For AdminRightsCheck handlers: run the command in its chat's mailbox."""
+
+    @wraps(handler)
+    async def wrapper(client, message, _, chat_id):
+        return await run_in_chat(chat_id, handler, client, message, _, chat_id)
+
+    return wrapper
+
+
+def mailbox_stats() -> dict:
+    return {
+        "chats": len(actors),
+        "queued": sum(len(actor.mailbox) for actor in actors.values()),
+    }
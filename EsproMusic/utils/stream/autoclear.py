@@ -1,6 +1,7 @@
 import os
 
 from config import autoclean
+from EsproMusic.utils.mediacache import media_cache
 
 
 async def auto_clean(popped):
@@ -8,7 +9,7 @@ async def auto_clean(popped):
         rem = popped["file"]
         autoclean.remove(rem)
         count = autoclean.count(rem)
-        if count == 0:
+        if count == 0 and not media_cache.owns(rem):
             if "vid_" not in rem or "live_" not in rem or "index_" not in rem:
                 try:
                     os.remove(rem)
@@ -0,0 +1,55 @@
+import asyncio
+import os
+from typing import Optional
+
+from config import NORMALIZE_AUDIO
+from EsproMusic.logging import LOGGER
+from EsproMusic.utils.mediacache import media_cache
+from EsproMusic.utils.process import run_ffmpeg
+
+# What PyTgCalls' ffmpeg produces for HighQualityAudio; reading it back needs
+# no decoding or resampling.
+PCM_FORMAT = "s16le"
+PCM_RATE = 48000
+PCM_CHANNELS = 2
+PCM_INPUT = f"-f {PCM_FORMAT} -ar {PCM_RATE} -ac {PCM_CHANNELS}"
+
+normalizing = {}
+
+
+def _key(path: str) -> tuple:
+    return (os.path.basename(path), PCM_FORMAT)
+
+
+def normalized(path) -> Optional[str]:
+    """Raw PCM copy of a cached audio file, if one has been made."""
+    if not NORMALIZE_AUDIO or not media_cache.owns(path):
+        return None
+    key = _key(str(path))
+    return media_cache.get(key) if media_cache.has(key) else None
+
+
+def schedule_normalize(path: str):
+    """Decode a freshly cached audio file to PCM in the background."""
+    if not NORMALIZE_AUDIO or not media_cache.owns(path):
+        return
+    key = _key(path)
+    if key in normalizing or media_cache.has(key):
+        return
+    task = asyncio.create_task(_normalize(path, key))
+    normalizing[key] = task
+    task.add_done_callback(lambda _: normalizing.pop(key, None))
+
+
+async def _normalize(path: str, key: tuple):
+    temp = media_cache.temp_path(key, "pcm")
+    try:
+        code = await run_ffmpeg(
+            f"ffmpeg -y -i {path} -f {PCM_FORMAT} -ar {PCM_RATE} -ac {PCM_CHANNELS} {temp}"
+        )
+        if code != 0 or not os.path.isfile(temp):
+            raise RuntimeError(f"ffmpeg exited with {code}")
+        media_cache.commit(key, temp, "pcm")
+    except Exception as e:
+        media_cache.discard(temp)
+        LOGGER(__name__).warning(f"Normalizing {path} failed: {e}")
@@ -0,0 +1,75 @@
+import shutil
+from typing import Optional, Tuple
+
+from EsproMusic.logging import LOGGER
+from EsproMusic.utils.mediacache import media_cache
+
+STREAM = "stream"
+PROGRESSIVE = "progressive"
+DOWNLOAD = "download"
+
+# Rough sizes of what the API serves, in bytes per second of media
+AUDIO_BYTES_PER_SEC = 160 * 1000 // 8
+VIDEO_BYTES_PER_SEC = 2500 * 1000 // 8
+
+ASSUMED_THROUGHPUT = 2 * 1024 * 1024  # bytes/s until real downloads have been measured
+MIN_FREE_DISK = 1024 * 1024 * 1024  # keep at least 1 GB free after a download
+MAX_CACHE_SHARE = 0.25  # a single file may use at most this share of the cache budget
+MAX_FETCH_WAIT = 15.0  # longest acceptable wait for a full download before playback
+PROGRESSIVE_MIN_WAIT = 1.0  # below this a full download is fast enough anyway
+PROGRESSIVE_HEADROOM = 2.0  # download must outpace playback by this factor to play while growing
+
+
+def estimate_bytes(duration_sec: int, video: bool) -> int:
+    return int(duration_sec * (VIDEO_BYTES_PER_SEC if video else AUDIO_BYTES_PER_SEC))
+
+
+def can_play_progressive(throughput: Optional[float]) -> bool:
+    """True when audio downloads fast enough that playback won't catch up with them."""
+    rate = throughput or ASSUMED_THROUGHPUT
+    return rate >= AUDIO_BYTES_PER_SEC * PROGRESSIVE_HEADROOM
+
+
+def choose_mode(
+    vid: str,
+    duration_sec: int,
+    video: bool,
+    throughput: Optional[float] = None,
+    progressive: bool = True,
+) -> Tuple[str, str]:
+    """
+    Decide how a track should reach ffmpeg: a direct stream URL, a download
+    played while it grows, or a full download. Returns (mode, reason).
+    """
+    size = estimate_bytes(duration_sec, video)
+    rate = throughput or ASSUMED_THROUGHPUT
+    wait = size / rate if rate else 0
+    try:
+        free = shutil.disk_usage(media_cache.root).free
+    except OSError:
+        free = 0
+
+    if not duration_sec:
+        mode, reason = DOWNLOAD, "unknown duration"
+    elif size > media_cache.budget * MAX_CACHE_SHARE:
+        mode, reason = STREAM, "larger than cache share"
+    elif free - size < MIN_FREE_DISK:
+        mode, reason = STREAM, "low disk space"
+    elif (
+        progressive
+        and not video
+        and wait > PROGRESSIVE_MIN_WAIT
+        and can_play_progressive(throughput)
+    ):
+        mode, reason = PROGRESSIVE, "slow enough to play while downloading"
+    elif wait > MAX_FETCH_WAIT:
+        mode, reason = STREAM, "download would take too long"
+    else:
+        mode, reason = DOWNLOAD, "fast download"
+
+    LOGGER(__name__).info(
+        f"Playback policy for {vid}: {mode} ({reason}); duration={duration_sec}s "
+        f"video={bool(video)} est={size}B throughput={int(rate)}B/s "
+        f"wait={wait:.1f}s free={free}B"
+    )
+    return mode, reason
@@ -0,0 +1,106 @@
+import asyncio
+
+from config import DURATION_LIMIT, PREFETCH_DEPTH, autoclean, time_to_seconds
+from EsproMusic import LOGGER, YouTube
+from EsproMusic.misc import db
+from EsproMusic.utils.cache import SingleFlight
+from EsproMusic.utils.stream.actor import run_in_chat
+
+prefetching = {}
+_resolving = SingleFlight()
+
+
+def schedule_prefetch(chat_id: int):
+    """
+    Start preparing the next queued YouTube tracks of a chat in the background.
+
+    Playlist placeholders inside the window are resolved first, then their
+    media is downloaded into the cache.
+    """
+    queue = db.get(chat_id)
+    if not queue or PREFETCH_DEPTH <= 0:
+        return
+    for entry in queue[1 : PREFETCH_DEPTH + 1]:
+        if "vid_" not in str(entry.get("file")):
+            continue
+        video = str(entry.get("streamtype")) == "video"
+        if entry.get("pending"):
+            key = ("pending", id(entry))
+            coro = _prefetch_pending(chat_id, entry, video)
+        else:
+            key = (entry["vidid"], video)
+            coro = _prefetch(*key)
+        if key in prefetching:
+            coro.close()
+            continue
+        task = asyncio.create_task(coro)
+        prefetching[key] = task
+        task.add_done_callback(lambda _, key=key: prefetching.pop(key, None))
+
+
+async def _prefetch(vidid: str, video: bool):
+    try:
+        await YouTube.prefetch(vidid, video)
+    except Exception as e:
+        LOGGER(__name__).warning(f"Prefetch of {vidid} failed: {e}")
+
+
+async def _prefetch_pending(chat_id: int, entry: dict, video: bool):
+    if not await resolve_pending(entry):
+        await run_in_chat(chat_id, _drop, chat_id, entry)
+        return schedule_prefetch(chat_id)
+    await _prefetch(entry["vidid"], video)
+
+
+async def _drop(chat_id: int, entry: dict):
+    queue = db.get(chat_id) or []
+    for index, queued in enumerate(queue):
+        if queued is entry:
+            del queue[index]
+            break
+
+
+async def resolve_pending(entry: dict) -> bool:
+    """Fill in a playlist placeholder; False if it turned out to be unplayable."""
+    pending = entry.get("pending")
+    if not pending:
+        return True
+    return await _resolving.do(id(entry), lambda: _resolve(entry, pending))
+
+
+async def _resolve(entry: dict, pending: dict) -> bool:
+    try:
+        title, duration_min, duration_sec, _, vidid = await YouTube.details(
+            pending["query"], pending["videoid"]
+        )
+    except Exception:
+        return False
+    if str(duration_min) == "None" or duration_sec > DURATION_LIMIT:
+        return False
+    try:
+        duration_in_seconds = time_to_seconds(duration_min) - 3
+    except:
+        duration_in_seconds = 0
+    entry.update(
+        {
+            "title": title.title(),
+            "dur": duration_min,
+            "file": f"vid_{vidid}",
+            "vidid": vidid,
+            "seconds": duration_in_seconds,
+        }
+    )
+    entry.pop("pending", None)
+    autoclean.append(entry["file"])
+    return True
+
+
+async def resolve_queue_head(chat_id: int) -> bool:
+    """Resolve placeholders at the head of the queue, dropping unplayable ones."""
+    queue = db.get(chat_id)
+    while queue:
+        entry = queue[0]
+        if await resolve_pending(entry):
+            return True
+        await run_in_chat(chat_id, _drop, chat_id, entry)
+    return False
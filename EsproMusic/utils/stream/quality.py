@@ -0,0 +1,82 @@
+import asyncio
+
+import psutil
+from pytgcalls.types.input_stream.quality import (
+    HighQualityAudio,
+    LowQualityAudio,
+    LowQualityVideo,
+    MediumQualityAudio,
+    MediumQualityVideo,
+)
+
+from EsproMusic.logging import LOGGER
+
+# Best first; the governor moves every chat this many steps down from its own profile
+PROFILES = {
+    "high": (HighQualityAudio, MediumQualityVideo),
+    "medium": (MediumQualityAudio, LowQualityVideo),
+    "low": (LowQualityAudio, LowQualityVideo),
+}
+LEVELS = list(PROFILES)
+DEFAULT_PROFILE = "high"
+
+GOVERNOR_INTERVAL = 10
+CPU_HIGH = 85.0  # percent, step down at or above
+CPU_LOW = 60.0  # percent, step back up below (after CALM_TICKS quiet samples)
+LAG_HIGH = 0.25  # seconds the event loop woke up late
+LAG_LOW = 0.05
+CALM_TICKS = 3
+
+governor = {"level": 0, "cpu": 0.0, "lag": 0.0, "calm": 0}
+
+
+def effective_profile(chat_id: int, level: int = None) -> str:
+    """The chat's own profile, lowered by the governor's current (or given) level."""
+    from EsproMusic.utils.database import peek_chat_setting
+
+    base = LEVELS.index(peek_chat_setting(chat_id, "quality") or DEFAULT_PROFILE)
+    level = governor["level"] if level is None else level
+    return LEVELS[min(len(LEVELS) - 1, base + level)]
+
+
+def stream_parameters(chat_id: int = None) -> tuple:
+    """(audio_parameters, video_parameters) to build a chat's stream with."""
+    audio, video = PROFILES[effective_profile(chat_id)]
+    return audio(), video()
+
+
+async def govern(on_change):
+    """
+    Sample CPU and event-loop lag forever, stepping the quality level down
+    under load and back up once it has been calm for a while. `on_change` is
+    awaited with (old_level, new_level) whenever the level moves.
+    """
+    loop = asyncio.get_running_loop()
+    psutil.cpu_percent(interval=None)
+    while True:
+        start = loop.time()
+        await asyncio.sleep(GOVERNOR_INTERVAL)
+        lag = max(0.0, loop.time() - start - GOVERNOR_INTERVAL)
+        cpu = psutil.cpu_percent(interval=None)
+        governor.update(cpu=cpu, lag=round(lag, 3))
+        old = level = governor["level"]
+        if cpu >= CPU_HIGH or lag >= LAG_HIGH:
+            governor["calm"] = 0
+            level = min(len(LEVELS) - 1, level + 1)
+        elif cpu < CPU_LOW and lag < LAG_LOW:
+            governor["calm"] += 1
+            if governor["calm"] >= CALM_TICKS and level > 0:
+                governor["calm"] = 0
+                level -= 1
+        else:
+            governor["calm"] = 0
+        if level == old:
+            continue
+        governor["level"] = level
+        LOGGER(__name__).info(
+            f"Quality level {old} -> {level} (cpu={cpu}% lag={lag:.3f}s)"
+        )
+        try:
+            await on_change(old, level)
+        except Exception as e:
+            LOGGER(__name__).warning(f"Applying quality level {level} failed: {e}")
@@ -1,8 +1,9 @@
-import asyncio
 from typing import Union
 
 from EsproMusic.misc import db
-from EsproMusic.utils.formatters import check_duration, seconds_to_min
+from EsproMusic.utils.formatters import seconds_to_min
+from EsproMusic.utils.process import probe_duration
+from EsproMusic.utils.stream.prefetch import schedule_prefetch
 from config import autoclean, time_to_seconds
 
 
@@ -45,6 +46,41 @@ async def put_queue(
     else:
         db[chat_id].append(put)
     autoclean.append(file)
+    schedule_prefetch(chat_id)
+
+
+async def put_queue_pending(
+    chat_id,
+    original_chat_id,
+    query,
+    user,
+    user_id,
+    stream,
+    videoid: Union[bool, str] = None,
+    title: str = None,
+):
+    """
+    Queue a playlist entry without looking it up.
+
+    Only the search query (or video ID) is stored; metadata and media are
+    resolved once the entry enters the prefetch window or reaches the head.
+    `title` is shown until then instead of the raw query.
+    """
+    put = {
+        "title": title or str(query),
+        "dur": "--:--",
+        "streamtype": stream,
+        "by": user,
+        "user_id": user_id,
+        "chat_id": original_chat_id,
+        "file": "vid_pending",
+        "vidid": None,
+        "seconds": 0,
+        "played": 0,
+        "pending": {"query": query, "videoid": videoid},
+    }
+    db[chat_id].append(put)
+    schedule_prefetch(chat_id)
 
 
 async def put_queue_index(
@@ -60,9 +96,7 @@ async def put_queue_index(
 ):
     if "20.212.146.162" in vidid:
         try:
-            dur = await asyncio.get_event_loop().run_in_executor(
-                None, check_duration, vidid
-            )
+            dur = await probe_duration(vidid)
             duration = seconds_to_min(dur)
         except:
             duration = "ᴜʀʟ sᴛʀᴇᴀᴍ"
@@ -1,4 +1,7 @@
+import asyncio
 import os
+import time
+from functools import partial
 from random import randint
 from typing import Union
 
@@ -12,10 +15,48 @@ from EsproMusic.utils.database import add_active_video_chat, is_active_chat
 from EsproMusic.utils.exceptions import AssistantErr
 from EsproMusic.utils.inline import aq_markup, close_markup, stream_markup
 from EsproMusic.utils.pastebin import RitikBin
-from EsproMusic.utils.stream.queue import put_queue, put_queue_index
+from EsproMusic.utils.stream.actor import run_in_chat
+from EsproMusic.utils.stream.queue import put_queue, put_queue_index, put_queue_pending
 from EsproMusic.utils.thumbnails import gen_thumb
 
 
+# Queue changes for a chat go through its mailbox, after any skip or track end.
+# Lookups, downloads and replies happen outside it, so they never hold up the chat.
+
+
+async def _queue_if_active(chat_id, queue):
+    """Add to a chat that is already playing; None if nothing is playing."""
+    if not await is_active_chat(chat_id):
+        return None
+    await queue()
+    return len(db.get(chat_id)) - 1
+
+
+async def _play_or_queue(chat_id, queue, join, forceplay=None):
+    """
+    Start `join` with this as the only entry, or queue it if the chat started
+    playing in the meantime. Returns (queue position, entry); 0 means playing.
+    """
+    if forceplay:
+        await Ritik.force_stop_stream(chat_id)
+    else:
+        position = await _queue_if_active(chat_id, queue)
+        if position is not None:
+            return position, db[chat_id][-1]
+        db[chat_id] = []
+    await join()
+    await queue(forceplay=forceplay)
+    return 0, db[chat_id][0]
+
+
+async def _attach(chat_id, entry, run, markup):
+    """Keep the now-playing message on `entry` unless it already left the head."""
+    check = db.get(chat_id)
+    if check and check[0] is entry:
+        entry["mystic"] = run
+        entry["markup"] = markup
+
+
 async def stream(
     _,
     mystic,
@@ -31,30 +72,76 @@ async def stream(
 ):
     if not result:
         return
-    if forceplay:
-        await Ritik.force_stop_stream(chat_id)
+    # Time-to-first-audio is measured from the bot's first reply to the command
+    started = mystic.date.timestamp() if getattr(mystic, "date", None) else time.time()
     if streamtype == "playlist":
         msg = f"{_['play_19']}\n\n"
         count = 0
-        for search in result:
-            if int(count) == config.PLAYLIST_FETCH_LIMIT:
-                continue
-            try:
-                (
-                    title,
-                    duration_min,
-                    duration_sec,
-                    thumbnail,
-                    vidid,
-                ) = await YouTube.details(search, False if spotify else True)
-            except:
-                continue
-            if str(duration_min) == "None":
-                continue
-            if duration_sec > config.DURATION_LIMIT:
-                continue
-            if await is_active_chat(chat_id):
-                await put_queue(
+        # Resolve entries concurrently but consume them in playlist order, so the
+        # first track starts while later lookups are still running.
+        semaphore = asyncio.Semaphore(config.PLAYLIST_RESOLVE_CONCURRENCY)
+
+        async def resolve(search):
+            async with semaphore:
+                try:
+                    return await YouTube.details(search, False if spotify else True)
+                except Exception:
+                    return None
+
+        # Only the first few entries are looked up now; once playback has
+        # started, the rest are queued as placeholders and resolved on demand.
+        eager = max(1, config.PLAYLIST_EAGER_RESOLVE)
+        tasks = {}
+
+        def lookahead(start, stop):
+            for index in range(start, min(stop, len(result))):
+                if index not in tasks:
+                    tasks[index] = asyncio.create_task(resolve(result[index]))
+
+        lookahead(0, eager)
+        # Video IDs mean nothing to users; search text (Spotify) is shown as is
+        pending_title = None if spotify else _["play_24"]
+        try:
+            for index, search in enumerate(result):
+                if int(count) == config.PLAYLIST_FETCH_LIMIT:
+                    break
+                if index >= eager and index not in tasks and not forceplay:
+                    queued = await run_in_chat(
+                        chat_id,
+                        _queue_if_active,
+                        chat_id,
+                        partial(
+                            put_queue_pending,
+                            chat_id,
+                            original_chat_id,
+                            search,
+                            user_name,
+                            user_id,
+                            "video" if video else "audio",
+                            videoid=False if spotify else True,
+                            title=pending_title,
+                        ),
+                    )
+                    if queued is not None:
+                        position = queued
+                        count += 1
+                        msg += f"{count}. {(pending_title or str(search))[:70]}\n"
+                        msg += f"{_['play_20']} {position}\n\n"
+                        continue
+                if index >= eager:
+                    # Still looking for a playable first track: keep a full
+                    # window of lookups running instead of one at a time
+                    lookahead(index, index + config.PLAYLIST_RESOLVE_CONCURRENCY)
+                details = await tasks[index]
+                if not details:
+                    continue
+                title, duration_min, duration_sec, thumbnail, vidid = details
+                if str(duration_min) == "None":
+                    continue
+                if duration_sec > config.DURATION_LIMIT:
+                    continue
+                queue = partial(
+                    put_queue,
                     chat_id,
                     original_chat_id,
                     f"vid_{vidid}",
@@ -65,13 +152,15 @@ async def stream(
                     user_id,
                     "video" if video else "audio",
                 )
-                position = len(db.get(chat_id)) - 1
-                count += 1
-                msg += f"{count}. {title[:70]}\n"
-                msg += f"{_['play_20']} {position}\n\n"
-            else:
+                queued = None
                 if not forceplay:
-                    db[chat_id] = []
+                    queued = await run_in_chat(chat_id, _queue_if_active, chat_id, queue)
+                if queued is not None:
+                    position = queued
+                    count += 1
+                    msg += f"{count}. {title[:70]}\n"
+                    msg += f"{_['play_20']} {position}\n\n"
+                    continue
                 status = True if video else None
                 try:
                     file_path, direct = await YouTube.download(
@@ -79,14 +168,8 @@ async def stream(
                     )
                 except:
                     raise AssistantErr(_["play_14"])
-                await Ritik.join_call(
-                    chat_id,
-                    original_chat_id,
-                    file_path,
-                    video=status,
-                    image=thumbnail,
-                )
-                await put_queue(
+                queue = partial(
+                    put_queue,
                     chat_id,
                     original_chat_id,
                     file_path if direct else f"vid_{vidid}",
@@ -96,8 +179,25 @@ async def stream(
                     vidid,
                     user_id,
                     "video" if video else "audio",
-                    forceplay=forceplay,
                 )
+                join = partial(
+                    Ritik.join_call,
+                    chat_id,
+                    original_chat_id,
+                    file_path,
+                    video=status,
+                    image=thumbnail,
+                    started=started,
+                )
+                position, entry = await run_in_chat(
+                    chat_id, _play_or_queue, chat_id, queue, join, forceplay
+                )
+                forceplay = None
+                if position:
+                    count += 1
+                    msg += f"{count}. {title[:70]}\n"
+                    msg += f"{_['play_20']} {position}\n\n"
+                    continue
                 img = await gen_thumb(vidid)
                 button = stream_markup(_, chat_id)
                 run = await app.send_photo(
@@ -112,8 +212,10 @@ async def stream(
                     reply_markup=InlineKeyboardMarkup(button),
                     has_spoiler=True
                 )
-                db[chat_id][0]["mystic"] = run
-                db[chat_id][0]["markup"] = "stream"
+                await run_in_chat(chat_id, _attach, chat_id, entry, run, "stream")
+        finally:
+            for task in tasks.values():
+                task.cancel()
         if count == 0:
             return
         else:
@@ -144,19 +246,31 @@ async def stream(
             )
         except:
             raise AssistantErr(_["play_14"])
-        if await is_active_chat(chat_id):
-            await put_queue(
-                chat_id,
-                original_chat_id,
-                file_path if direct else f"vid_{vidid}",
-                title,
-                duration_min,
-                user_name,
-                vidid,
-                user_id,
-                "video" if video else "audio",
-            )
-            position = len(db.get(chat_id)) - 1
+        queue = partial(
+            put_queue,
+            chat_id,
+            original_chat_id,
+            file_path if direct else f"vid_{vidid}",
+            title,
+            duration_min,
+            user_name,
+            vidid,
+            user_id,
+            "video" if video else "audio",
+        )
+        join = partial(
+            Ritik.join_call,
+            chat_id,
+            original_chat_id,
+            file_path,
+            video=status,
+            image=thumbnail,
+            started=started,
+        )
+        position, entry = await run_in_chat(
+            chat_id, _play_or_queue, chat_id, queue, join, forceplay
+        )
+        if position:
             button = aq_markup(_, chat_id)
             await app.send_message(
                 chat_id=original_chat_id,
@@ -164,27 +278,6 @@ async def stream(
                 reply_markup=InlineKeyboardMarkup(button),
             )
         else:
-            if not forceplay:
-                db[chat_id] = []
-            await Ritik.join_call(
-                chat_id,
-                original_chat_id,
-                file_path,
-                video=status,
-                image=thumbnail,
-            )
-            await put_queue(
-                chat_id,
-                original_chat_id,
-                file_path if direct else f"vid_{vidid}",
-                title,
-                duration_min,
-                user_name,
-                vidid,
-                user_id,
-                "video" if video else "audio",
-                forceplay=forceplay,
-            )
             img = await gen_thumb(vidid)
             button = stream_markup(_, chat_id)
             run = await app.send_photo(
@@ -199,25 +292,35 @@ async def stream(
                 reply_markup=InlineKeyboardMarkup(button),
                 has_spoiler=True
             )
-            db[chat_id][0]["mystic"] = run
-            db[chat_id][0]["markup"] = "stream"
+            await run_in_chat(chat_id, _attach, chat_id, entry, run, "stream")
     elif streamtype == "soundcloud":
         file_path = result["filepath"]
         title = result["title"]
         duration_min = result["duration_min"]
-        if await is_active_chat(chat_id):
-            await put_queue(
-                chat_id,
-                original_chat_id,
-                file_path,
-                title,
-                duration_min,
-                user_name,
-                streamtype,
-                user_id,
-                "audio",
-            )
-            position = len(db.get(chat_id)) - 1
+        queue = partial(
+            put_queue,
+            chat_id,
+            original_chat_id,
+            file_path,
+            title,
+            duration_min,
+            user_name,
+            streamtype,
+            user_id,
+            "audio",
+        )
+        join = partial(
+            Ritik.join_call,
+            chat_id,
+            original_chat_id,
+            file_path,
+            video=None,
+            started=started,
+        )
+        position, entry = await run_in_chat(
+            chat_id, _play_or_queue, chat_id, queue, join, forceplay
+        )
+        if position:
             button = aq_markup(_, chat_id)
             await app.send_message(
                 chat_id=original_chat_id,
@@ -225,21 +328,6 @@ async def stream(
                 reply_markup=InlineKeyboardMarkup(button),
             )
         else:
-            if not forceplay:
-                db[chat_id] = []
-            await Ritik.join_call(chat_id, original_chat_id, file_path, video=None)
-            await put_queue(
-                chat_id,
-                original_chat_id,
-                file_path,
-                title,
-                duration_min,
-                user_name,
-                streamtype,
-                user_id,
-                "audio",
-                forceplay=forceplay,
-            )
             button = stream_markup(_, chat_id)
             run = await app.send_photo(
                 original_chat_id,
@@ -250,27 +338,37 @@ async def stream(
                 reply_markup=InlineKeyboardMarkup(button),
                 has_spoiler=True
             )
-            db[chat_id][0]["mystic"] = run
-            db[chat_id][0]["markup"] = "tg"
+            await run_in_chat(chat_id, _attach, chat_id, entry, run, "tg")
     elif streamtype == "telegram":
         file_path = result["path"]
         link = result["link"]
         title = (result["title"]).title()
         duration_min = result["dur"]
         status = True if video else None
-        if await is_active_chat(chat_id):
-            await put_queue(
-                chat_id,
-                original_chat_id,
-                file_path,
-                title,
-                duration_min,
-                user_name,
-                streamtype,
-                user_id,
-                "video" if video else "audio",
+        queue = partial(
+            put_queue,
+            chat_id,
+            original_chat_id,
+            file_path,
+            title,
+            duration_min,
+            user_name,
+            streamtype,
+            user_id,
+            "video" if video else "audio",
+        )
+
+        async def join():
+            await Ritik.join_call(
+                chat_id, original_chat_id, file_path, video=status, started=started
             )
-            position = len(db.get(chat_id)) - 1
+            if video:
+                await add_active_video_chat(chat_id)
+
+        position, entry = await run_in_chat(
+            chat_id, _play_or_queue, chat_id, queue, join, forceplay
+        )
+        if position:
             button = aq_markup(_, chat_id)
             await app.send_message(
                 chat_id=original_chat_id,
@@ -278,23 +376,6 @@ async def stream(
                 reply_markup=InlineKeyboardMarkup(button),
             )
         else:
-            if not forceplay:
-                db[chat_id] = []
-            await Ritik.join_call(chat_id, original_chat_id, file_path, video=status)
-            await put_queue(
-                chat_id,
-                original_chat_id,
-                file_path,
-                title,
-                duration_min,
-                user_name,
-                streamtype,
-                user_id,
-                "video" if video else "audio",
-                forceplay=forceplay,
-            )
-            if video:
-                await add_active_video_chat(chat_id)
             button = stream_markup(_, chat_id)
             run = await app.send_photo(
                 original_chat_id,
@@ -303,8 +384,7 @@ async def stream(
                 reply_markup=InlineKeyboardMarkup(button),
                 has_spoiler=True
             )
-            db[chat_id][0]["mystic"] = run
-            db[chat_id][0]["markup"] = "tg"
+            await run_in_chat(chat_id, _attach, chat_id, entry, run, "tg")
     elif streamtype == "live":
         link = result["link"]
         vidid = result["vidid"]
@@ -312,50 +392,46 @@ async def stream(
         thumbnail = result["thumb"]
         duration_min = "Live Track"
         status = True if video else None
-        if await is_active_chat(chat_id):
-            await put_queue(
-                chat_id,
-                original_chat_id,
-                f"live_{vidid}",
-                title,
-                duration_min,
-                user_name,
-                vidid,
-                user_id,
-                "video" if video else "audio",
-            )
-            position = len(db.get(chat_id)) - 1
-            button = aq_markup(_, chat_id)
-            await app.send_message(
-                chat_id=original_chat_id,
-                text=_["queue_4"].format(position, title[:27], duration_min, user_name),
-                reply_markup=InlineKeyboardMarkup(button),
-            )
-        else:
-            if not forceplay:
-                db[chat_id] = []
+        queue = partial(
+            put_queue,
+            chat_id,
+            original_chat_id,
+            f"live_{vidid}",
+            title,
+            duration_min,
+            user_name,
+            vidid,
+            user_id,
+            "video" if video else "audio",
+        )
+        position = None
+        if not forceplay:
+            position = await run_in_chat(chat_id, _queue_if_active, chat_id, queue)
+        if position is None:
+            # Only a live stream that is about to play needs its URL resolved
             n, file_path = await YouTube.video(link)
             if n == 0:
                 raise AssistantErr(_["str_3"])
-            await Ritik.join_call(
+            join = partial(
+                Ritik.join_call,
                 chat_id,
                 original_chat_id,
                 file_path,
                 video=status,
                 image=thumbnail if thumbnail else None,
+                started=started,
             )
-            await put_queue(
-                chat_id,
-                original_chat_id,
-                f"live_{vidid}",
-                title,
-                duration_min,
-                user_name,
-                vidid,
-                user_id,
-                "video" if video else "audio",
-                forceplay=forceplay,
+            position, entry = await run_in_chat(
+                chat_id, _play_or_queue, chat_id, queue, join, forceplay
             )
+        if position:
+            button = aq_markup(_, chat_id)
+            await app.send_message(
+                chat_id=original_chat_id,
+                text=_["queue_4"].format(position, title[:27], duration_min, user_name),
+                reply_markup=InlineKeyboardMarkup(button),
+            )
+        else:
             img = await gen_thumb(vidid)
             button = stream_markup(_, chat_id)
             run = await app.send_photo(
@@ -370,49 +446,40 @@ async def stream(
                 reply_markup=InlineKeyboardMarkup(button),
                 has_spoiler=True
             )
-            db[chat_id][0]["mystic"] = run
-            db[chat_id][0]["markup"] = "tg"
+            await run_in_chat(chat_id, _attach, chat_id, entry, run, "tg")
     elif streamtype == "index":
         link = result
         title = "ɪɴᴅᴇx ᴏʀ ᴍ3ᴜ8 ʟɪɴᴋ"
         duration_min = "00:00"
-        if await is_active_chat(chat_id):
-            await put_queue_index(
-                chat_id,
-                original_chat_id,
-                "index_url",
-                title,
-                duration_min,
-                user_name,
-                link,
-                "video" if video else "audio",
-            )
-            position = len(db.get(chat_id)) - 1
+        queue = partial(
+            put_queue_index,
+            chat_id,
+            original_chat_id,
+            "index_url",
+            title,
+            duration_min,
+            user_name,
+            link,
+            "video" if video else "audio",
+        )
+        join = partial(
+            Ritik.join_call,
+            chat_id,
+            original_chat_id,
+            link,
+            video=True if video else None,
+            started=started,
+        )
+        position, entry = await run_in_chat(
+            chat_id, _play_or_queue, chat_id, queue, join, forceplay
+        )
+        if position:
             button = aq_markup(_, chat_id)
             await mystic.edit_text(
                 text=_["queue_4"].format(position, title[:27], duration_min, user_name),
                 reply_markup=InlineKeyboardMarkup(button),
             )
         else:
-            if not forceplay:
-                db[chat_id] = []
-            await Ritik.join_call(
-                chat_id,
-                original_chat_id,
-                link,
-                video=True if video else None,
-            )
-            await put_queue_index(
-                chat_id,
-                original_chat_id,
-                "index_url",
-                title,
-                duration_min,
-                user_name,
-                link,
-                "video" if video else "audio",
-                forceplay=forceplay,
-            )
             button = stream_markup(_, chat_id)
             run = await app.send_photo(
                 original_chat_id,
@@ -421,6 +488,5 @@ async def stream(
                 reply_markup=InlineKeyboardMarkup(button),
                 has_spoiler=True
             )
-            db[chat_id][0]["mystic"] = run
-            db[chat_id][0]["markup"] = "tg"
+            await run_in_chat(chat_id, _attach, chat_id, entry, run, "tg")
             await mystic.delete()
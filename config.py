@@ -1,5 +1,5 @@
 import re
-from os import getenv
+from os import environ, getenv
 
 from dotenv import load_dotenv
 from pyrogram import filters
@@ -54,6 +54,10 @@ SPOTIFY_CLIENT_SECRET = getenv("SPOTIFY_CLIENT_SECRET", None)
 
 # Maximum limit for fetching playlist's track from youtube, spotify, apple links.
 PLAYLIST_FETCH_LIMIT = int(getenv("PLAYLIST_FETCH_LIMIT", 25))
+# How many playlist entries are looked up at the same time.
+PLAYLIST_RESOLVE_CONCURRENCY = int(getenv("PLAYLIST_RESOLVE_CONCURRENCY", 5))
+# Playlist entries looked up when queued; the rest are resolved just before they play.
+PLAYLIST_EAGER_RESOLVE = int(getenv("PLAYLIST_EAGER_RESOLVE", 3))
 
 
 # Telegram audio and video file size limit (in bytes)
@@ -62,12 +66,52 @@ TG_VIDEO_FILESIZE_LIMIT = int(getenv("TG_VIDEO_FILESIZE_LIMIT", 1073741824))
 # Checkout https://www.gbmb.org/mb-to-bytes for converting mb to bytes
 
 
+# On-disk cache for downloaded songs, kept under this size (in MB).
+MEDIA_CACHE_DIR = getenv("MEDIA_CACHE_DIR", "downloads/media")
+MEDIA_CACHE_SIZE = int(getenv("MEDIA_CACHE_SIZE", 2048))
+# Eviction policy for the media cache: "lru" (least recently played) or "lfu" (least played)
+MEDIA_CACHE_POLICY = getenv("MEDIA_CACHE_POLICY", "lru")
+# Also keep downloaded audio decoded to raw 48kHz stereo PCM, the format calls play, so
+# repeat plays, seeks and loops skip decoding. Uses roughly 10x the disk of the MP3.
+NORMALIZE_AUDIO = getenv("NORMALIZE_AUDIO", "False").lower() in ("true", "1", "yes")
+# Speed-changed copies made when a tempo change cannot be applied live (in MB).
+PLAYBACK_CACHE_DIR = getenv("PLAYBACK_CACHE_DIR", "playback")
+PLAYBACK_CACHE_SIZE = int(getenv("PLAYBACK_CACHE_SIZE", 1024))
+
+# Maximum simultaneous song downloads; the playing track always goes ahead of prefetches.
+DOWNLOAD_CONCURRENCY = int(getenv("DOWNLOAD_CONCURRENCY", 4))
+# Maximum ffmpeg/ffprobe jobs run by the bot itself at once (calls' own ffmpeg not included).
+FFMPEG_CONCURRENCY = int(getenv("FFMPEG_CONCURRENCY", 2))
+# How many upcoming queue entries to download in the background while a song plays.
+PREFETCH_DEPTH = int(getenv("PREFETCH_DEPTH", 2))
+# Seconds between reloads of the global on/off flags (autoend, logger, maintenance) so
+# several bot replicas sharing one database agree. 0 loads them once at startup only.
+FLAGS_REFRESH_INTERVAL = int(getenv("FLAGS_REFRESH_INTERVAL", 60))
+
+
 # Get your pyrogram v2 session from @StringFatherBot on Telegram
-STRING1 = getenv("STRING_SESSION", None)
-STRING2 = getenv("STRING_SESSION2", None)
-STRING3 = getenv("STRING_SESSION3", None)
-STRING4 = getenv("STRING_SESSION4", None)
-STRING5 = getenv("STRING_SESSION5", None)
+# Any number of assistants can be added as STRING_SESSION, STRING_SESSION2, STRING_SESSION3, ...
+STRING_SESSIONS = {}
+_session_keys = {}
+for key, value in sorted(environ.items()):
+    match = re.fullmatch(r"STRING_SESSION(\d*)", key)
+    if not match or not value:
+        continue
+    # STRING_SESSION and STRING_SESSION1 both name assistant 1
+    number = int(match.group(1) or 1)
+    if number == 0:
+        raise SystemExit(
+            f"[ERROR] - {key} is not allowed, assistant numbers start at 1 (STRING_SESSION or STRING_SESSION1)."
+        )
+    if number in STRING_SESSIONS:
+        raise SystemExit(
+            f"[ERROR] - {_session_keys[number]} and {key} both set assistant {number}. Please keep only one of them."
+        )
+    STRING_SESSIONS[number] = value
+    _session_keys[number] = key
+STRING_SESSIONS = dict(sorted(STRING_SESSIONS.items()))
+# Seconds an assistant (or its voice chat client) may take to start before it is skipped
+ASSISTANT_START_TIMEOUT = int(getenv("ASSISTANT_START_TIMEOUT", 30))
 
 
 BANNED_USERS = filters.user()